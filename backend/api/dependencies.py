@@ -1,3 +1,39 @@
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from db.database import Database
+from typing import Optional
+from db.models import Collection, Document, DocumentContent
 
 database = Database()
+
+async def aget_owned_collection(collection_id: int, user_id: int, db: AsyncSession):
+    collection = await db.scalar(select(Collection).where(Collection.id == collection_id,
+                                                          Collection.owner_id == user_id))
+    if not collection:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    return collection
+
+async def aget_owned_document(document_id: int, user_id: int, db: AsyncSession):
+    document = await db.scalar(select(Document).join(Collection, Document.collection_id == Collection.id)
+                               .where(Document.id == document_id, Collection.owner_id == user_id))
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
+def cursor_page(items: list, limit: int):
+    # callers fetch limit + 1 rows ordered by id, the extra row only signals that another page exists
+    return {"items": items[:limit], "next_cursor": items[limit - 1]["id"] if len(items) > limit else None}
+
+def document_page_query(collection_id: int, limit: int, cursor: Optional[int]):
+    query = select(Document.id, Document.file_name, Document.file_type, Document.uploaded_at, DocumentContent.size) \
+        .outerjoin(DocumentContent, DocumentContent.document_id == Document.id) \
+        .where(Document.collection_id == collection_id)
+    if cursor is not None:
+        query = query.where(Document.id > cursor)
+    return query.order_by(Document.id).limit(limit + 1)
+
+async def aget_document_page(collection_id: int, limit: int, cursor: Optional[int], db: AsyncSession):
+    rows = (await db.execute(document_page_query(collection_id, limit, cursor))).all()
+    return cursor_page([{"id": row.id, "file_name": row.file_name, "file_type": row.file_type,
+                         "uploaded_at": row.uploaded_at, "size": row.size} for row in rows], limit)
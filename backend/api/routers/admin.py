@@ -1,12 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
-from services.rag_functionality import get_current_model, set_custom_context, get_custom_context
+from fastapi import APIRouter, HTTPException, Depends, Request
+from services.rag_functionality import get_current_model, set_current_model, set_custom_context, get_custom_context, embedding_cache, index_registry, embed_model, reranker
 from sqlalchemy.orm import Session
+from services.response_cache import response_cache
+from services.principal_cache import principal_cache
+from services.index_registry import peak_rss_mb
 from api.schemas import ModelChange, CustomContextUpdate
 import os
-from datetime import datetime
 from dotenv import load_dotenv
 from api.dependencies import database
-from db.models import AdminSettings
 
 load_dotenv()
 
@@ -22,16 +23,7 @@ def change_model(model_data: ModelChange, db: Session = Depends(database.get_db)
     if model_data.admin_password != admin_password:
         raise HTTPException(status_code=401, detail="Unauthorized acces")
 
-    existing_setting = db.query(AdminSettings).filter(AdminSettings.setting_key == "openai_model").first()
-
-    if existing_setting:
-        existing_setting.setting_value = model_data.model_name
-        existing_setting.updated_at = datetime.utcnow()
-    else:
-        new_setting = AdminSettings(setting_key="openai_model", setting_value=model_data.model_name)
-        db.add(new_setting)
-
-    db.commit()
+    set_current_model(model_data.model_name, db)
 
     return {"message": f"Model changed to {model_data.model_name} successfully"}
 
@@ -53,4 +45,30 @@ def set_custom_context_endpoint(context_data: CustomContextUpdate, db: Session =
 @router.get("/current-custom-context")
 def get_current_custom_context_setting(db: Session = Depends(database.get_db)):
     custom_context = get_custom_context(db)
-    return {"custom_context": custom_context}
\ No newline at end of file
+    return {"custom_context": custom_context}
+
+@router.get("/embedding-cache")
+def get_embedding_cache_stats():
+    return embedding_cache.stats()
+
+@router.get("/response-cache")
+def get_response_cache_stats():
+    return response_cache.stats()
+
+@router.get("/principal-cache")
+def get_principal_cache_stats():
+    return principal_cache.stats()
+
+@router.get("/indexes")
+def get_index_stats(request: Request):
+    return {
+        "startup_seconds": request.app.state.startup_seconds,
+        "startup_rss_mb": request.app.state.startup_rss_mb,
+        "peak_rss_mb": peak_rss_mb(),
+        "embedding_model_loaded": embed_model.loaded,
+        **index_registry.stats()
+    }
+
+@router.get("/reranker")
+def get_reranker_stats():
+    return {"enabled": True, **reranker.stats()} if reranker else {"enabled": False}
\ No newline at end of file
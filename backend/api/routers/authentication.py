@@ -1,20 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from api.schemas import UserCreate, UserLogin
 from db.models import User
 from api.dependencies import database
-from core.auth import hash_password, verify_password, create_access_token
+from core.auth import ahash_password, averify_password, create_access_token
 
 router = APIRouter(tags=["auth"])
 
 @router.post("/register")
-def register(user_data: UserCreate, db: Session = Depends(database.get_db)):
-    existing_user = db.query(User).filter(user_data.name == User.name).first()
+async def register(user_data: UserCreate, db: AsyncSession = Depends(database.get_async_db)):
+    existing_user = await db.scalar(select(User).where(User.name == user_data.name))
 
     if existing_user:
         raise HTTPException(status_code=400, detail="User already exists")
     
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await ahash_password(user_data.password)
 
     user = User(
         name=user_data.name,
@@ -23,15 +24,15 @@ def register(user_data: UserCreate, db: Session = Depends(database.get_db)):
     )
 
     db.add(user)
-    db.commit()
+    await db.commit()
 
     return {"Message": "User created succesfully"}
 
 @router.post("/login")
-def login(user_data: UserLogin, db: Session = Depends(database.get_db)):
-    user = db.query(User).filter(User.name == user_data.name).first()
+async def login(user_data: UserLogin, db: AsyncSession = Depends(database.get_async_db)):
+    user = await db.scalar(select(User).where(User.name == user_data.name))
 
-    if not user or not verify_password(user_data.password, user.password_hash):
+    if not user or not await averify_password(user_data.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_access_token(user.id)
@@ -1,24 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException
-from core.auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from core.auth import get_current_user, aget_current_user
 from sqlalchemy.orm import Session
-from api.schemas import Query
-from services.rag_functionality import query_collection_index
-from api.dependencies import database
-from db.models import Collection, ChatHistory, User
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from api.schemas import Query, QueryResponse, BatchQuery, MultiCollectionQuery, MultiCollectionQueryResponse
+from services.rag_functionality import aquery_collection_index, aquery_collections, aquery_collection_batch, stream_collection_index, resolve_sources, response_cache_key, get_llm_instance
+from services.conversation_memory import conversation_memory
+from services.response_cache import response_cache
+from api.dependencies import database, aget_owned_collection
+from db.models import Collection, ChatHistory, ChatSummary, User
+import json, time
 
 router = APIRouter(
     tags=["chat"]
 )
 
-@router.post("/query/simple")
-def simple_query(query_data: Query, current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
-    collection = db.query(Collection).filter(Collection.id == query_data.collection_id,
-                                             Collection.owner_id == current_user.id).first()
+def chat_history_query(collection_id: int, user_id: int):
+    return select(ChatHistory).where(ChatHistory.collection_id == collection_id,
+                                     ChatHistory.user_id == user_id).order_by(ChatHistory.created_at)
 
-    if not collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
+def recent_turns_query(collection_id: int, user_id: int):
+    return select(ChatHistory.id, ChatHistory.query, ChatHistory.response).where(
+        ChatHistory.user_id == user_id, ChatHistory.collection_id == collection_id
+    ).order_by(ChatHistory.created_at.desc(), ChatHistory.id.desc()).limit(conversation_memory.max_turns)
+
+def chat_summary_query(collection_id: int, user_id: int):
+    return select(ChatSummary).where(ChatSummary.user_id == user_id, ChatSummary.collection_id == collection_id)
+
+def get_context_messages(collection_id: int, user_id: int, db: Session):
+    turns = db.execute(recent_turns_query(collection_id, user_id)).all()
+    chat_summary = db.scalar(chat_summary_query(collection_id, user_id))
+    return conversation_memory.build_context(turns, chat_summary.summary if chat_summary else None)
+
+async def aget_context_messages(collection_id: int, user_id: int, db: AsyncSession):
+    turns = (await db.execute(recent_turns_query(collection_id, user_id))).all()
+    chat_summary = await db.scalar(chat_summary_query(collection_id, user_id))
+    return conversation_memory.build_context(turns, chat_summary.summary if chat_summary else None)
+
+def roll_chat_summary(collection_id: int, user_id: int):
+    # runs after the response is sent, so folding old turns into the summary never adds to answer latency
+    db = database.db_session()
+    try:
+        turns = db.execute(recent_turns_query(collection_id, user_id)).all()
+        chat_summary = db.scalar(chat_summary_query(collection_id, user_id))
+        pending_turns = conversation_memory.pending_turns(turns, chat_summary.summarized_through_id if chat_summary else None)
+        if not pending_turns:
+            return
+
+        summary = conversation_memory.summarize(get_llm_instance(db), chat_summary.summary if chat_summary else None, pending_turns)
+        if not chat_summary:
+            chat_summary = ChatSummary(user_id=user_id, collection_id=collection_id)
+            db.add(chat_summary)
+        chat_summary.summary = summary
+        chat_summary.summarized_through_id = pending_turns[-1].id
+        db.commit()
+    finally:
+        db.close()
+
+def new_chat_record(query: str, response_text: str, collection_id: int, user_id: int):
+    return ChatHistory(
+        query=query,
+        response=response_text,
+        collection_id=collection_id,
+        user_id=user_id)
+
+def sse_event(event: str, data: dict):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def stream_answer(query: str, tokens, sources: list, started_at: float, on_complete=None):
+    response_tokens = []
+    time_to_first_token = None
+    try:
+        for token in tokens:
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - started_at
+            response_tokens.append(token)
+            yield sse_event("token", {"token": token})
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
+        return
+
+    response_text = "".join(response_tokens)
+    if on_complete:
+        on_complete(response_text)
 
-    result = query_collection_index(query_data.query, query_data.collection_id, db)
+    yield sse_event("done", {
+        "query": query,
+        "response": response_text,
+        "sources": sources,
+        "time_to_first_token_ms": round(time_to_first_token * 1000, 1) if time_to_first_token is not None else None,
+        "total_ms": round((time.perf_counter() - started_at) * 1000, 1)
+    })
+
+def stream_no_documents(query: str, started_at: float):
+    return StreamingResponse(stream_answer(query, iter(["No documents found in this collection"]), [], started_at),
+                             media_type="text/event-stream")
+
+@router.post("/query/simple", response_model=QueryResponse)
+async def simple_query(query_data: Query, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    await aget_owned_collection(query_data.collection_id, current_user.id, db)
+
+    result = await aquery_collection_index(query_data.query, query_data.collection_id, db)
 
     return {
         "query": query_data.query,
@@ -26,33 +110,18 @@ def simple_query(query_data: Query, current_user: User = Depends(get_current_use
         "sources": result["sources"]
     }
 
-@router.post("/query/chat")
-def chat_query(query_data: Query, current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
-    collection = db.query(Collection).filter(Collection.id == query_data.collection_id,
-                                             Collection.owner_id == current_user.id).first()
-    
-    if not collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
-
-    chat_history = db.query(ChatHistory).filter(ChatHistory.collection_id == query_data.collection_id,
-                                                ChatHistory.user_id == current_user.id).order_by(ChatHistory.created_at).limit(10).all()
+@router.post("/query/chat", response_model=QueryResponse)
+async def chat_query(query_data: Query, background_tasks: BackgroundTasks, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    await aget_owned_collection(query_data.collection_id, current_user.id, db)
 
-    context_messages = []
-    for chat in chat_history:
-        context_messages.append(f"Human: {chat.query}")
-        context_messages.append(f"Assistant: {chat.response}")
+    context_messages = await aget_context_messages(query_data.collection_id, current_user.id, db)
 
-    result = query_collection_index(query_data.query, query_data.collection_id, db, context=context_messages)
+    result = await aquery_collection_index(query_data.query, query_data.collection_id, db, context=context_messages)
     response_text = result["response"]
 
-    chat_record = ChatHistory(
-        query=query_data.query,
-        response=response_text,
-        collection_id=query_data.collection_id,
-        user_id=current_user.id)
-
-    db.add(chat_record)
-    db.commit()
+    db.add(new_chat_record(query_data.query, response_text, query_data.collection_id, current_user.id))
+    await db.commit()
+    background_tasks.add_task(roll_chat_summary, query_data.collection_id, current_user.id)
 
     return {
         "query": query_data.query,
@@ -60,15 +129,96 @@ def chat_query(query_data: Query, current_user: User = Depends(get_current_user)
         "sources": result["sources"]
     }
 
-@router.get("/chat-history/{collection_id}")
-def get_chat_history(collection_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
-    collection = db.query(Collection).filter(Collection.id == collection_id,
+@router.post("/query/batch")
+async def batch_query(query_data: BatchQuery, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    await aget_owned_collection(query_data.collection_id, current_user.id, db)
+
+    async def results():
+        # the request session may already be closed once the body is streaming
+        async with database.async_db_session() as stream_db:
+            async for result in aquery_collection_batch(query_data.queries, query_data.collection_id, stream_db):
+                yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.post("/query/multi", response_model=MultiCollectionQueryResponse)
+async def multi_collection_query(query_data: MultiCollectionQuery, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    collection_ids = list(dict.fromkeys(query_data.collection_ids))
+    collections = (await db.execute(select(Collection.id, Collection.name).where(Collection.id.in_(collection_ids),
+                                                                                 Collection.owner_id == current_user.id))).all()
+    if len(collections) != len(collection_ids):
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    result = await aquery_collections(query_data.query, collection_ids, db)
+    collection_names = {collection.id: collection.name for collection in collections}
+
+    return {
+        "query": query_data.query,
+        "response": result["response"],
+        "sources": result["sources"],
+        "collections": [{"collection_id": collection_id, "collection_name": collection_names[collection_id],
+                         "sources": [source for source in result["sources"] if source["collection_id"] == collection_id]}
+                        for collection_id in collection_ids]
+    }
+
+@router.post("/query/simple/stream")
+def simple_query_stream(query_data: Query, current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
+    started_at = time.perf_counter()
+    collection = db.query(Collection).filter(Collection.id == query_data.collection_id,
                                              Collection.owner_id == current_user.id).first()
-    
+
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found")
+
+    cache_key = response_cache_key(query_data.query, query_data.collection_id, db)
+    cached_response = response_cache.lookup(*cache_key)
+    if cached_response:
+        return StreamingResponse(stream_answer(query_data.query, iter([cached_response["response"]]), cached_response["sources"], started_at),
+                                 media_type="text/event-stream")
+
+    streaming_response = stream_collection_index(query_data.query, query_data.collection_id, db)
+    if streaming_response is None:
+        return stream_no_documents(query_data.query, started_at)
+    sources = resolve_sources(streaming_response.source_nodes, db)
+
+    def on_complete(response_text: str):
+        response_cache.store(*cache_key, {"response": response_text, "sources": sources})
+
+    return StreamingResponse(stream_answer(query_data.query, streaming_response.response_gen, sources, started_at, on_complete),
+                             media_type="text/event-stream")
+
+@router.post("/query/chat/stream")
+def chat_query_stream(query_data: Query, current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
+    started_at = time.perf_counter()
+    collection = db.query(Collection).filter(Collection.id == query_data.collection_id,
+                                             Collection.owner_id == current_user.id).first()
+
+    if not collection:
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    context_messages = get_context_messages(query_data.collection_id, current_user.id, db)
+    streaming_response = stream_collection_index(query_data.query, query_data.collection_id, db, context=context_messages)
+    if streaming_response is None:
+        return stream_no_documents(query_data.query, started_at)
+    sources = resolve_sources(streaming_response.source_nodes, db)
+    user_id = current_user.id
+
+    def on_complete(response_text: str):
+        # the request session may already be closed once the body is streaming
+        stream_db = database.db_session()
+        try:
+            stream_db.add(new_chat_record(query_data.query, response_text, query_data.collection_id, user_id))
+            stream_db.commit()
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(stream_answer(query_data.query, streaming_response.response_gen, sources, started_at, on_complete),
+                             media_type="text/event-stream", background=BackgroundTask(roll_chat_summary, query_data.collection_id, user_id))
+
+@router.get("/chat-history/{collection_id}")
+async def get_chat_history(collection_id: int, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    await aget_owned_collection(collection_id, current_user.id, db)
     
-    chat_history = db.query(ChatHistory).filter(ChatHistory.collection_id == collection_id,
-                                                ChatHistory.user_id == current_user.id).order_by(ChatHistory.created_at).all()
+    chat_history = (await db.scalars(chat_history_query(collection_id, current_user.id))).all()
     
     return [{"query": chat.query, "response": chat.response, "created_at": chat.created_at} for chat in chat_history]
\ No newline at end of file
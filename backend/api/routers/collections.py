@@ -1,70 +1,122 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from db.models import User, Collection, Document, IndexedCollection
-from core.auth import get_current_user
-from api.dependencies import database
-from api.schemas import CollectionCreate
-from services.rag_functionality import chroma_client, all_collection_id
+from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete
+from typing import Optional, Dict
+from db.models import User, Collection, Document, DocumentContent, IndexedCollection, ChatSummary, CollectionChunking, CollectionVersion
+from core.auth import aget_current_user
+from api.dependencies import database, aget_owned_collection, cursor_page, aget_document_page
+from api.schemas import CollectionCreate, ChunkingUpdate
+from services.rag_functionality import get_chroma_client, index_registry, lexical_indexes
+from services.response_cache import response_cache
+from services.chunking import CHUNKERS, default_strategies
+from services.file_processing import FileProcess
 
 router = APIRouter(
     prefix="/collections",
     tags=["collections"]
 )
 
+async def save_chunking(collection_id: int, strategies: Dict[str, str], db: AsyncSession):
+    file_types = FileProcess(None, None).get_extensions()
+    for file_type, strategy in strategies.items():
+        if file_type not in file_types:
+            raise HTTPException(status_code=400, detail=f"File type not supported: {file_type}")
+        if strategy not in CHUNKERS:
+            raise HTTPException(status_code=400, detail=f"Unknown chunking strategy: {strategy}")
+        await db.merge(CollectionChunking(collection_id=collection_id, file_type=file_type, strategy=strategy))
+
 @router.post("/")
-def create_collection(collection_data: CollectionCreate, current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
+async def create_collection(collection_data: CollectionCreate, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
     collection = Collection(
         name=collection_data.name,
         owner_id=current_user.id,
     )
 
     db.add(collection)
-    db.commit()
-    
+    if collection_data.chunking:
+        await db.flush()
+        await save_chunking(collection.id, collection_data.chunking, db)
+    await db.commit()
+
     return {
         "id": collection.id,
         "message": "Collection created succesfully!"
     }
 
 @router.get("/")
-def get_collections(current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
-    collections = db.query(Collection).filter(Collection.owner_id == current_user.id).all()
-    return [{"id": c.id, "name": c.name, "created_at": c.created_at} for c in collections]
+async def get_collections(limit: int = Query(50, ge=1, le=200), cursor: Optional[int] = None,
+                          current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    query = select(Collection.id, Collection.name, Collection.created_at).where(Collection.owner_id == current_user.id)
+    if cursor is not None:
+        query = query.where(Collection.id > cursor)
+    rows = (await db.execute(query.order_by(Collection.id).limit(limit + 1))).all()
+    return cursor_page([{"id": row.id, "name": row.name, "created_at": row.created_at} for row in rows], limit)
 
 
 @router.get("/{collection_id}")
-def get_collection(collection_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
-    collection = db.query(Collection).filter(Collection.owner_id == current_user.id,
-                                             Collection.id == collection_id).first()
-    
-    if not collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
+async def get_collection(collection_id: int, limit: int = Query(50, ge=1, le=200), cursor: Optional[int] = None,
+                         current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    collection = await aget_owned_collection(collection_id, current_user.id, db)
 
-    documents = db.query(Document).filter(Document.collection_id == collection_id).all()
+    document_page = await aget_document_page(collection_id, limit, cursor, db)
 
     return {
         "id": collection.id,
         "name": collection.name,
         "created_at": collection.created_at,
-        "documents": [{"id": d.id, "file_name": d.file_name, "file_type": d.file_type} for d in documents]
+        "documents": document_page["items"],
+        "next_cursor": document_page["next_cursor"]
     }
 
+@router.get("/{collection_id}/chunking")
+async def get_chunking(collection_id: int, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    await aget_owned_collection(collection_id, current_user.id, db)
+
+    overrides = (await db.execute(select(CollectionChunking.file_type, CollectionChunking.strategy)
+                                  .where(CollectionChunking.collection_id == collection_id))).all()
+    file_types = FileProcess(None, None).get_extensions()
+    strategies = {file_type: default_strategies.get(file_type, "sentence") for file_type in file_types}
+    strategies.update({row.file_type: row.strategy for row in overrides})
+
+    return {"strategies": strategies, "available": list(CHUNKERS)}
+
+# only documents uploaded or replaced afterwards are chunked with the new strategies
+@router.put("/{collection_id}/chunking")
+async def update_chunking(collection_id: int, chunking_data: ChunkingUpdate, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    await aget_owned_collection(collection_id, current_user.id, db)
+
+    await save_chunking(collection_id, chunking_data.strategies, db)
+    await db.commit()
+
+    return {"message": "Chunking strategies updated"}
+
 @router.delete("/{collection_id}")
-def remove_collection(collection_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
-    collection = db.query(Collection).filter(Collection.id == collection_id,
-                                            Collection.owner_id == current_user.id).first()
+async def remove_collection(collection_id: int, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    collection = await aget_owned_collection(collection_id, current_user.id, db)
 
-    indexed_collection = db.query(IndexedCollection).filter(IndexedCollection.collection_id == collection_id).first()
+    # waits for in-flight queries on this collection, so it runs off the event loop
+    if not await run_in_threadpool(index_registry.begin_removal, collection_id):
+        raise HTTPException(status_code=409, detail="Collection is in use, try again later")
+    try:
+        indexed_collection = await db.get(IndexedCollection, collection_id)
 
-    if indexed_collection:
-        chroma_client.delete_collection(name=indexed_collection.chroma_collection_name)
-        db.delete(indexed_collection)
+        if indexed_collection:
+            await run_in_threadpool(lambda: get_chroma_client().delete_collection(name=indexed_collection.chroma_collection_name))
+            await db.delete(indexed_collection)
 
-    if collection_id in all_collection_id:
-        del all_collection_id[collection_id]
+        response_cache.invalidate(collection_id)
+        await run_in_threadpool(lexical_indexes.drop, collection_id)
 
-    db.query(Document).filter(Document.collection_id == collection.id).delete()
-    db.delete(collection)
-    db.commit()
+        await db.execute(delete(DocumentContent).where(DocumentContent.document_id.in_(
+            select(Document.id).where(Document.collection_id == collection.id))))
+        await db.execute(delete(Document).where(Document.collection_id == collection.id))
+        await db.execute(delete(ChatSummary).where(ChatSummary.collection_id == collection.id))
+        await db.execute(delete(CollectionChunking).where(CollectionChunking.collection_id == collection.id))
+        await db.execute(delete(CollectionVersion).where(CollectionVersion.collection_id == collection.id))
+        await db.delete(collection)
+        await db.commit()
+    finally:
+        index_registry.end_removal(collection_id)
 
-    return {"message": "Collection deleted successfully"}
\ No newline at end of file
+    return {"message": "Collection deleted successfully"}
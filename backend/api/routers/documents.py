@@ -1,56 +1,100 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from db.models import User, Collection
-from api.dependencies import database
-from sqlalchemy.orm import Session
-from services.rag_functionality import index_document, Document
-from core.auth import get_current_user
-import os
-from services.file_processing import FileProcess
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from db.models import User, DocumentContent, IngestionJobRecord
+from api.dependencies import database, aget_owned_collection, aget_owned_document, aget_document_page
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete
+from typing import Optional
+from services.rag_functionality import ause_collection_index, remove_document_chunks, abump_collection_version
+from services.response_cache import response_cache
+from services.document_store import aload_document_content
+from core.auth import aget_current_user
+import os, queue
+from services.file_processing import FileProcess, spool_upload, discard_spooled
+from services.ingestion import ingestion_queue, IngestionJob, upload_spool_threshold, job_status
 
 router = APIRouter(
     prefix="/documents",
     tags=["documents"]
 )
 
-@router.post("/upload")
-def upload_document(collection_id: int, file: UploadFile = File(...), current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
+async def queue_upload(file: UploadFile, user_id: int, collection_id: int, replace_document_id: int = None):
+    file_extension = os.path.splitext(file.filename)[1][1:]
 
-    collection = db.query(Collection).filter(Collection.id == collection_id, Collection.owner_id == current_user.id).first()
+    if file_extension not in FileProcess(file_extension, None).get_extensions():
+        raise HTTPException(status_code=400, detail="File type not supported")
 
-    if not collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
+    content = await run_in_threadpool(spool_upload, file.file, upload_spool_threshold)
 
-    content = file.file.read()
+    job = IngestionJob(user_id, collection_id, file.filename, file_extension, content, replace_document_id)
+    try:
+        await run_in_threadpool(ingestion_queue.submit, job)
+    except queue.Full:
+        discard_spooled(content)
+        raise HTTPException(status_code=503, detail="Ingestion queue is full, try again later")
+    return job
 
-    file_extension = os.path.splitext(file.filename)[1][1:]
-    file_processor = FileProcess(file_extension, content)
+@router.post("/upload", status_code=202)
+async def upload_document(collection_id: int, file: UploadFile = File(...), current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
 
-    if file_extension in file_processor.get_extensions():
-        processed_content = file_processor.process_file()
-    else:
-        raise HTTPException(status_code=400, detail="File type not supported")
-    
-    document = Document(
-        file_name=file.filename,
-        file_type=file_extension,
-        content=processed_content,
-        collection_id=collection_id
-    )
+    await aget_owned_collection(collection_id, current_user.id, db)
 
-    db.add(document)
-    db.commit()
-    index_document(document, db)
+    job = await queue_upload(file, current_user.id, collection_id)
 
-    return {"message": "Document uploaded successfully"}
+    return {"message": "Document queued for ingestion", "job_id": job.id}
 
 
-@router.get("/{collection_id}")
-def get_documents(collection_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
-    collection = db.query(Collection).filter(Collection.id == collection_id,
-                                             Collection.owner_id == current_user.id).first()
+@router.put("/{document_id}", status_code=202)
+async def replace_document(document_id: int, file: UploadFile = File(...), current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    document = await aget_owned_document(document_id, current_user.id, db)
+
+    job = await queue_upload(file, current_user.id, document.collection_id, document.id)
+
+    return {"message": "Document queued for re-indexing", "job_id": job.id}
+
+
+@router.delete("/{document_id}")
+async def delete_document(document_id: int, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    document = await aget_owned_document(document_id, current_user.id, db)
+
+    async with ause_collection_index(document.collection_id, db) as index:
+        if index is not None:
+            await run_in_threadpool(remove_document_chunks, index, document.collection_id, document.id)
+
+    await db.execute(delete(DocumentContent).where(DocumentContent.document_id == document.id))
+    await db.delete(document)
+    await abump_collection_version(document.collection_id, db)
+    await db.commit()
+    response_cache.invalidate(document.collection_id)
+
+    return {"message": "Document deleted successfully"}
 
-    if not collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
 
-    documents = db.query(Document).filter(Document.collection_id == collection_id).all()
-    return [{"content": d.content, "uploaded_at": d.uploaded_at, "file_name": d.file_name} for d in documents]
\ No newline at end of file
+@router.get("/jobs/metrics")
+async def get_ingestion_metrics(current_user: User = Depends(aget_current_user)):
+    return ingestion_queue.metrics()
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    job = await db.get(IngestionJobRecord, job_id)
+
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job_status(job)
+
+
+@router.get("/{document_id}/content")
+async def get_document_content(document_id: int, current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    document = await aget_owned_document(document_id, current_user.id, db)
+
+    return {"id": document.id, "file_name": document.file_name, "content": await aload_document_content(document.id, db)}
+
+
+@router.get("/{collection_id}")
+async def get_documents(collection_id: int, limit: int = Query(50, ge=1, le=200), cursor: Optional[int] = None,
+                        current_user: User = Depends(aget_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    await aget_owned_collection(collection_id, current_user.id, db)
+
+    return await aget_document_page(collection_id, limit, cursor, db)
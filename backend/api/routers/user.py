@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends
-from core.auth import get_current_user
+from core.auth import get_current_user, aget_current_user
 from db.models import User
 from sqlalchemy.orm import Session
 from api.dependencies import database
+from services.principal_cache import principal_cache
 
 router = APIRouter(
     prefix="/profile",
@@ -10,7 +11,7 @@ router = APIRouter(
 )
 
 @router.get("/")
-def get_profile(current_user: User = Depends(get_current_user)):
+def get_profile(current_user: User = Depends(aget_current_user)):
     return {
         "id": current_user.id,
         "name": current_user.name,
@@ -22,4 +23,5 @@ def get_profile(current_user: User = Depends(get_current_user)):
 def update_profile(new_email: str, current_user: User = Depends(get_current_user), db: Session = Depends(database.get_db)):
     current_user.email = new_email
     db.commit()
+    principal_cache.invalidate(current_user.id)
     return {"message": "Profile updated sucessfully"}
\ No newline at end of file
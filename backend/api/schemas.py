@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 
 class UserCreate(BaseModel):
     name: str
@@ -12,11 +12,23 @@ class UserLogin(BaseModel):
 
 class CollectionCreate(BaseModel):
     name: str
+    chunking: Optional[Dict[str, str]] = None
+
+class ChunkingUpdate(BaseModel):
+    strategies: Dict[str, str]
 
 class Query(BaseModel):
     query: str
     collection_id: int
 
+class BatchQuery(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=500)
+    collection_id: int
+
+class MultiCollectionQuery(BaseModel):
+    query: str
+    collection_ids: List[int] = Field(min_length=1, max_length=20)
+
 class ModelChange(BaseModel):
     admin_password: str
     model_name: str
@@ -29,8 +41,22 @@ class SourceInfo(BaseModel):
     document_name: str
     chunk_id: Optional[int]
     document_id: int
+    collection_id: Optional[int] = None
+    text: Optional[str] = None
+    score: Optional[float] = None
 
 class QueryResponse(BaseModel):
     query: str
     response: str
-    sources: List[SourceInfo]
\ No newline at end of file
+    sources: List[SourceInfo]
+
+class CollectionSources(BaseModel):
+    collection_id: int
+    collection_name: str
+    sources: List[SourceInfo]
+
+class MultiCollectionQueryResponse(BaseModel):
+    query: str
+    response: str
+    sources: List[SourceInfo]
+    collections: List[CollectionSources]
@@ -0,0 +1,90 @@
+import argparse, random, time, chromadb
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import QueryBundle, TextNode
+from llama_index.vector_stores.chroma import ChromaVectorStore
+from services.chunking import iter_chunks
+from services.file_processing import PAGE_BREAK
+from services.rag_functionality import embed_model
+from benchmarks.rerank_eval import MACHINES, COMPONENTS, ACTIONS
+
+# Run from the backend directory: python -m benchmarks.chunking_benchmark [--strategies sentence,token,pdf_sections]
+# Every file type gets a synthetic document whose questions each have one answer string; a question is a hit when
+# a retrieved chunk contains it. Embedding bypasses the embedding cache so ingest time is comparable between runs.
+SAFETY_NOTICE = ("SAFETY NOTICE\nDisconnect the power supply and wait for all moving parts to stop before any maintenance. "
+                 "Wear protective gloves and eye protection. Report every incident to the site supervisor.")
+
+def manual_pdf(rng: random.Random):
+    pages, questions = [], []
+    for section, machine in enumerate(MACHINES, start=1):
+        for subsection, component in enumerate(COMPONENTS, start=1):
+            lines = [f"{section}.{subsection} {machine.title()} {component}"]
+            for action, unit in ACTIONS:
+                interval = rng.randint(2, 500)
+                answer = f"The {component} must be {action} every {interval} {unit}."
+                lines.append(f"{answer} Use only parts approved for the {machine}.")
+                questions.append((f"How often must the {component} of the {machine} be {action}?", answer))
+            # the boilerplate repeated on every page is what near-duplicate removal is for
+            pages.append("\n".join(lines + [SAFETY_NOTICE]))
+    return "pdf", PAGE_BREAK.join(pages), questions
+
+def orders_csv(rng: random.Random):
+    header = f"{'order_id':>12} {'customer':>14} {'product':>12} {'quantity':>8} {'amount':>8}"
+    rows, questions = [], []
+    for i in range(1500):
+        order_id, amount = f"ORD-{i:05d}", f"{rng.uniform(5, 900):.2f}"
+        rows.append(f"{order_id:>12} {f'customer {rng.randint(1, 400)}':>14} {f'product {rng.randint(1, 80)}':>12} "
+                    f"{rng.randint(1, 20):>8} {amount:>8}")
+        if i % 15 == 0:
+            questions.append((f"What is the amount of order {order_id}?", order_id))
+    return "csv", "\n".join([header, *rows]), questions
+
+def catalog_xml(rng: random.Random):
+    products, questions = [], []
+    for i in range(600):
+        sku, machine, component = f"SKU-{i:05d}", rng.choice(MACHINES), rng.choice(COMPONENTS)
+        products.append(f'<product sku="{sku}"><name>{machine} {component} kit</name>'
+                        f"<price currency=\"EUR\">{rng.uniform(10, 2000):.2f}</price><stock>{rng.randint(0, 300)}</stock></product>")
+        if i % 6 == 0:
+            questions.append((f"What is the price of product {sku}?", sku))
+    return "xml", f"<catalog><products>{''.join(products)}</products></catalog>", questions
+
+def run_strategy(strategy: str, file_type: str, content: str, questions: list, top_k: int, client):
+    pages = list(enumerate(content.split(PAGE_BREAK), start=1)) if file_type == "pdf" else [(None, content)]
+    start = time.perf_counter()
+    chunks = [chunk for _, chunk in iter_chunks(strategy, pages)]
+    chunk_seconds = time.perf_counter() - start
+    without_dedup = sum(1 for _ in iter_chunks(strategy, pages, deduplicate=False))
+
+    start = time.perf_counter()
+    embeddings = embed_model.load().get_text_embedding_batch(chunks)
+    chroma_collection = client.create_collection(name=f"chunking_{file_type}_{strategy}")
+    index = VectorStoreIndex.from_vector_store(vector_store=ChromaVectorStore(chroma_collection=chroma_collection), embed_model=embed_model)
+    index.vector_store.add([TextNode(text=chunk, embedding=embedding, metadata={"chunk_index": i})
+                            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))])
+    ingest_seconds = chunk_seconds + time.perf_counter() - start
+
+    retriever = index.as_retriever(similarity_top_k=top_k)
+    hits = sum(any(answer in result.node.get_content() for result in retriever.retrieve(QueryBundle(question)))
+               for question, answer in questions)
+    words = sum(len(chunk.split()) for chunk in chunks)
+    print(f"{file_type:>4} {strategy:>13}: {len(chunks):5d} vectors ({without_dedup} without near-duplicate removal), "
+          f"{words / max(len(chunks), 1):6.0f} words/chunk, ingest {ingest_seconds:6.2f} s, "
+          f"hit rate@{top_k} {hits / len(questions):.2f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategies", default="sentence,token,csv_rows,xml_elements,pdf_sections")
+    parser.add_argument("--top-k", type=int, default=2)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    client = chromadb.EphemeralClient()
+    for file_type, content, questions in [manual_pdf(rng), orders_csv(rng), catalog_xml(rng)]:
+        for strategy in args.strategies.split(","):
+            # structure-aware strategies are only compared on the file type they were written for
+            if strategy.split("_")[0] in ("csv", "xml", "pdf") and not strategy.startswith(file_type):
+                continue
+            run_strategy(strategy, file_type, content, questions, args.top_k, client)
+
+if __name__ == "__main__":
+    main()
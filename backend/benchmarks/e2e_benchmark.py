@@ -0,0 +1,212 @@
+import argparse, csv, json, os, random, socket, statistics, subprocess, sys, tempfile, time, requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from benchmarks import fake_llm
+from benchmarks.load_test import percentile
+from benchmarks.synthetic_pdf import write_pdf, page_lines
+
+# Run from the backend directory: python -m benchmarks.e2e_benchmark --output results.json [--compare previous.json]
+# Starts the backend on a temporary SQLite database and Chroma directory, with the fake OpenAI server and the
+# hash embedding stand-in, so it runs offline and the numbers only move when the code does.
+# The response cache is disabled so every query goes through retrieval and the LLM.
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def write_corpus(directory: str, documents: int, pages: int, rng: random.Random):
+    paths = []
+    for i in range(documents):
+        pdf_path = os.path.join(directory, f"report_{i}.pdf")
+        write_pdf(pdf_path, pages, seed=i)
+
+        txt_path = os.path.join(directory, f"notes_{i}.txt")
+        with open(txt_path, "w") as txt:
+            for page_number in range(1, pages + 1):
+                txt.write("\n".join(page_lines(page_number, 45, rng)) + "\n")
+
+        csv_path = os.path.join(directory, f"orders_{i}.csv")
+        with open(csv_path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["order_id", "customer", "product", "quantity", "amount"])
+            for row in range(pages * 40):
+                writer.writerow([f"ORD-{i}-{row}", f"customer {rng.randint(1, 500)}", f"product {rng.randint(1, 80)}",
+                                 rng.randint(1, 20), round(rng.uniform(5, 900), 2)])
+        paths.extend([pdf_path, txt_path, csv_path])
+    return paths
+
+def start_backend(args, work_dir: str, port: int, llm_port: int):
+    env = {**os.environ,
+           "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'benchmark.db')}",
+           "CHROMA_PATH": os.path.join(work_dir, "chroma"),
+           "LEXICAL_INDEX_PATH": os.path.join(work_dir, "lexical_index"),
+           "EMBEDDING_CACHE_PATH": os.path.join(work_dir, "embedding_cache.sqlite3"),
+           "EMBEDDING_MODEL_NAME": "hash-embedding-384",
+           "OPENAI_API_BASE": f"http://127.0.0.1:{llm_port}/v1",
+           "OPENAI_API_KEY": "benchmark",
+           "OPENAI_MODEL": "gpt-4o-mini",
+           "SECRET_KEY": "benchmark",
+           "RESPONSE_CACHE_SIMILARITY": "2",
+           "RERANK_ENABLED": "false",
+           "WARM_UP_MODELS": "false",
+           "TRACING_EXPORTER": "none"}
+    env.pop("ASYNC_DATABASE_URL", None)
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.serve", "--port", str(port)], env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"backend exited with code {process.returncode}")
+        try:
+            requests.get(base_url, timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("backend did not start in time")
+
+def login(base_url: str):
+    credentials = {"name": "benchmark", "password": "benchmark-password"}
+    requests.post(f"{base_url}/register", json={**credentials, "email": "benchmark@example.com"})
+    response = requests.post(f"{base_url}/login", json=credentials)
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+def run_ingestion(base_url: str, headers: dict, collection_id: int, paths: list):
+    start = time.perf_counter()
+    job_ids = {}
+    for path in paths:
+        with open(path, "rb") as upload:
+            response = requests.post(f"{base_url}/documents/upload", params={"collection_id": collection_id},
+                                     files={"file": (os.path.basename(path), upload)}, headers=headers)
+        response.raise_for_status()
+        job_ids[response.json()["job_id"]] = os.path.splitext(path)[1][1:]
+
+    jobs = {}
+    while len(jobs) < len(job_ids):
+        for job_id in job_ids.keys() - jobs.keys():
+            job = requests.get(f"{base_url}/documents/jobs/{job_id}", headers=headers).json()
+            if job["status"] in ("completed", "failed"):
+                jobs[job_id] = job
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - start
+
+    by_type = {}
+    for job_id, job in jobs.items():
+        file_type = by_type.setdefault(job_ids[job_id], {"documents": 0, "chunks": 0, "failed": 0})
+        file_type["documents"] += 1
+        file_type["chunks"] += job["chunk_count"]
+        file_type["failed"] += job["status"] == "failed"
+    chunks = sum(file_type["chunks"] for file_type in by_type.values())
+    return {"seconds": round(elapsed, 2), "documents": len(jobs), "chunks": chunks,
+            "docs_per_second": round(len(jobs) / elapsed, 2), "chunks_per_second": round(chunks / elapsed, 1),
+            "by_type": by_type}
+
+def parse_server_timing(header: str):
+    stages = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, duration = entry.partition(";dur=")
+        if duration:
+            stages[name] = float(duration)
+    return stages
+
+def timed_request(session: requests.Session, url: str, payload: dict, headers: dict):
+    start = time.perf_counter()
+    response = session.post(url, json=payload, headers=headers)
+    return time.perf_counter() - start, response.status_code, parse_server_timing(response.headers.get("Server-Timing", ""))
+
+def run_queries(base_url: str, headers: dict, collection_id: int, endpoint: str, requests_count: int,
+                concurrency: int, rng: random.Random):
+    vocabulary = ["invoice", "contract", "clause", "payment", "delivery", "warranty", "liability", "order", "customer", "product"]
+    payloads = [{"collection_id": collection_id, "query": f"What does the {' '.join(rng.sample(vocabulary, 3))} say? ({i})"}
+                for i in range(requests_count)]
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda payload: timed_request(session, f"{base_url}{endpoint}", payload, headers), payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, status_code, _ in results if status_code == 200)
+    stage_names = {name for _, _, stages in results for name in stages}
+    return {"endpoint": endpoint, "concurrency": concurrency, "requests": len(results),
+            "errors": sum(1 for _, status_code, _ in results if status_code != 200),
+            "requests_per_second": round(len(results) / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+            "stage_median_ms": {name: round(statistics.median(stages.get(name, 0.0) for _, _, stages in results), 1)
+                                for name in sorted(stage_names)}}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(previous: dict, current: dict):
+    print(f"compared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    for metric in ("docs_per_second", "chunks_per_second"):
+        before, after = previous["ingestion"][metric], current["ingestion"][metric]
+        print(f"  ingestion {metric}: {before} -> {after} ({(after - before) / before * 100:+.1f}%)")
+    previous_levels = {(level["endpoint"], level["concurrency"]): level for level in previous["queries"]}
+    for level in current["queries"]:
+        before = previous_levels.get((level["endpoint"], level["concurrency"]))
+        if before and before["p95_ms"] and level["p95_ms"]:
+            print(f"  {level['endpoint']} x{level['concurrency']}: p95 {before['p95_ms']} -> {level['p95_ms']} ms "
+                  f"({(level['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=10, help="documents per file type")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--endpoints", default="/query/simple,/query/chat")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-token-latency-ms", type=float, default=5)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    llm_port = free_port()
+    llm_server = fake_llm.start(llm_port, args.llm_latency_ms, args.llm_token_latency_ms)
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = write_corpus(work_dir, args.documents, args.pages, rng)
+        process, base_url = start_backend(args, work_dir, free_port(), llm_port)
+        try:
+            headers = login(base_url)
+            collection_id = requests.post(f"{base_url}/collections/", json={"name": "benchmark"}, headers=headers).json()["id"]
+
+            ingestion = run_ingestion(base_url, headers, collection_id, paths)
+            print(f"ingestion: {ingestion['documents']} documents, {ingestion['chunks']} chunks in {ingestion['seconds']} s "
+                  f"({ingestion['docs_per_second']} docs/s, {ingestion['chunks_per_second']} chunks/s)")
+
+            queries = []
+            for endpoint in args.endpoints.split(","):
+                for concurrency in [int(level) for level in args.concurrency.split(",")]:
+                    level = run_queries(base_url, headers, collection_id, endpoint, args.requests, concurrency, rng)
+                    queries.append(level)
+                    print(f"{endpoint} concurrency {concurrency:>3}: {level['requests_per_second']:6.1f} req/s, "
+                          f"p50 {level['p50_ms']} ms, p95 {level['p95_ms']} ms, p99 {level['p99_ms']} ms, errors {level['errors']}")
+        finally:
+            process.terminate()
+            process.wait()
+            llm_server.shutdown()
+
+    results = {"commit": git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(), "config": vars(args),
+               "ingestion": ingestion, "queries": queries}
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), results)
+
+if __name__ == "__main__":
+    main()
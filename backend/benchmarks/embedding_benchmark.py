@@ -0,0 +1,80 @@
+import argparse, json, os, random, subprocess, sys, tempfile, time
+import numpy
+from benchmarks.rerank_eval import synthetic_manual
+
+# Run from the backend directory: python -m benchmarks.embedding_benchmark [--backends torch,onnx --chunks 2000]
+# Each backend runs in its own interpreter so peak RSS is not shared. Throughput is measured on repeated copies of
+# the synthetic maintenance manual, recall@k on its questions (each has exactly one answering chunk).
+# The first onnx run also exports and quantizes the model into ONNX_MODEL_DIR, run it twice for load timings.
+
+def run_backend(backend: str, chunks: int, vectors_path: str):
+    from services.index_registry import peak_rss_mb
+    from services.rag_functionality import load_embed_model
+
+    texts, questions = synthetic_manual(random.Random(0))
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    model = load_embed_model(backend)
+    load_seconds = time.perf_counter() - start
+
+    corpus = [f"{text} (copy {i // len(texts)})" for i, text in enumerate(texts * (chunks // len(texts) + 1))][:chunks]
+    start = time.perf_counter()
+    model.get_text_embedding_batch(corpus)
+    embed_seconds = time.perf_counter() - start
+
+    chunk_vectors = numpy.array(model.get_text_embedding_batch(texts))
+    start = time.perf_counter()
+    question_vectors = numpy.array([model.get_query_embedding(question) for question, _ in questions])
+    query_ms = (time.perf_counter() - start) / len(questions) * 1000
+    numpy.savez(vectors_path, chunks=chunk_vectors, questions=question_vectors)
+
+    print(json.dumps({"backend": backend, "load_seconds": round(load_seconds, 2),
+                      "chunks_per_second": round(len(corpus) / embed_seconds, 1),
+                      "query_ms": round(query_ms, 2), "baseline_rss_mb": rss_before, "peak_rss_mb": peak_rss_mb()}))
+
+def recall_at_k(vectors, questions: list, k: int):
+    scores = vectors["questions"] @ vectors["chunks"].T
+    top = numpy.argsort(-scores, axis=1)[:, :k]
+    return float(numpy.mean([answer_index in row for row, (_, answer_index) in zip(top, questions)]))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", default="torch,onnx")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=2)
+    parser.add_argument("--worker")
+    parser.add_argument("--vectors")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_backend(args.worker, args.chunks, args.vectors)
+        return
+
+    _, questions = synthetic_manual(random.Random(0))
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for backend in args.backends.split(","):
+            vectors_path = os.path.join(work_dir, f"{backend}.npz")
+            output = subprocess.run([sys.executable, "-m", "benchmarks.embedding_benchmark", "--worker", backend,
+                                     "--chunks", str(args.chunks), "--vectors", vectors_path],
+                                    capture_output=True, text=True, check=True).stdout
+            results[backend] = json.loads(output.strip().splitlines()[-1])
+            results[backend]["vectors"] = dict(numpy.load(vectors_path))
+            results[backend]["recall"] = recall_at_k(results[backend]["vectors"], questions, args.top_k)
+
+    print(f"{args.chunks} chunks, recall@{args.top_k} on {len(questions)} questions")
+    for backend, result in results.items():
+        print(f"{backend:>6}: load {result['load_seconds']} s, {result['chunks_per_second']} chunks/s, "
+              f"query {result['query_ms']} ms, peak RSS {result['peak_rss_mb']} MB "
+              f"(+{round(result['peak_rss_mb'] - result['baseline_rss_mb'], 1)} MB for the model), "
+              f"recall@{args.top_k} {result['recall']:.3f}")
+
+    if "torch" in results:
+        for backend, result in results.items():
+            if backend != "torch":
+                # vectors are normalized, so the row-wise dot product is the cosine similarity to the torch embedding
+                agreement = numpy.sum(result["vectors"]["chunks"] * results["torch"]["vectors"]["chunks"], axis=1)
+                print(f"{backend} vs torch: mean cosine {agreement.mean():.4f}, min {agreement.min():.4f}")
+
+if __name__ == "__main__":
+    main()
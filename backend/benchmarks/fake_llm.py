@@ -0,0 +1,93 @@
+import argparse, json, threading, time, uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# OpenAI-compatible stand-in so benchmarks run offline: python -m benchmarks.fake_llm --port 8100 --latency-ms 200
+# Point the backend at it with OPENAI_API_BASE=http://127.0.0.1:8100/v1. The answer quotes the question back,
+# after a fixed delay before the first token and a fixed delay per streamed token.
+ANSWER_WORDS = 40
+
+def answer_words(messages: list):
+    question = messages[-1]["content"] if messages else ""
+    words = (f"Based on the provided context the answer to {question[-200:]} is").split()
+    return (words + ["lorem"] * ANSWER_WORDS)[:ANSWER_WORDS]
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.2
+    token_latency = 0.005
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_event(self, body):
+        self.wfile.write(f"data: {body if isinstance(body, str) else json.dumps(body)}\n\n".encode())
+        self.wfile.flush()
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        messages = request.get("messages") or [{"role": "user", "content": request.get("prompt", "")}]
+        words = answer_words(messages)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        base = {"id": completion_id, "created": int(time.time()), "model": request.get("model", "fake")}
+        time.sleep(self.latency)
+
+        if not self.path.endswith("/chat/completions"):
+            self.send_json({**base, "object": "text_completion",
+                            "choices": [{"index": 0, "text": " ".join(words), "finish_reason": "stop", "logprobs": None}]})
+            return
+
+        if not request.get("stream"):
+            self.send_json({**base, "object": "chat.completion",
+                            "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                                         "finish_reason": "stop", "logprobs": None}],
+                            "usage": {"prompt_tokens": sum(len(str(message["content"]).split()) for message in messages),
+                                      "completion_tokens": len(words), "total_tokens": 0}})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for position, word in enumerate(words):
+            delta = {"role": "assistant", "content": word if position == 0 else f" {word}"}
+            self.send_event({**base, "object": "chat.completion.chunk",
+                             "choices": [{"index": 0, "delta": delta, "finish_reason": None, "logprobs": None}]})
+            time.sleep(self.token_latency)
+        self.send_event({**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop", "logprobs": None}]})
+        self.send_event("[DONE]")
+
+def make_server(port: int, latency_ms: float, token_latency_ms: float):
+    handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,),
+                   {"latency": latency_ms / 1000, "token_latency": token_latency_ms / 1000})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+def start(port: int, latency_ms: float, token_latency_ms: float):
+    server = make_server(port, latency_ms, token_latency_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--token-latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.latency_ms, args.token_latency_ms)
+    print(f"fake OpenAI API on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
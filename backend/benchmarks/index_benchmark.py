@@ -0,0 +1,47 @@
+import random, time, chromadb
+from llama_index.core import Document as LDocument, VectorStoreIndex
+from llama_index.core.text_splitter import SentenceSplitter
+from llama_index.vector_stores.chroma import ChromaVectorStore
+from services.rag_functionality import embed_model, build_nodes
+
+# Run from the backend directory: python -m benchmarks.index_benchmark
+PAGES = 500
+WORDS_PER_PAGE = 450
+
+def synthetic_document(pages: int, seed: int):
+    # a different seed per run keeps the embedding cache from serving the second run
+    random.seed(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    sentences = []
+    for _ in range(pages * WORDS_PER_PAGE // 15):
+        sentences.append(" ".join(random.choices(vocabulary, k=15)).capitalize() + ".")
+    return " ".join(sentences)
+
+def new_index(client, name: str):
+    chroma_collection = client.get_or_create_collection(name=name)
+    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+    return VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
+
+def per_chunk_insert(index, text_chunks: list):
+    for i, chunk in enumerate(text_chunks):
+        index.insert(LDocument(text=chunk, metadata={"document_id": 1, "chunk_index": i, "collection_id": 1}))
+
+def batched_insert(index, text_chunks: list):
+    metadatas = [{"document_id": 1, "chunk_index": i, "collection_id": 1} for i in range(len(text_chunks))]
+    index.vector_store.add(build_nodes(text_chunks, metadatas))
+
+def run():
+    text_splitter = SentenceSplitter(chunk_size=512, chunk_overlap=70)
+    client = chromadb.EphemeralClient()
+    print(f"{PAGES} pages, embed_batch_size={embed_model.embed_batch_size}")
+
+    for name, insert in [("per-chunk", per_chunk_insert), ("batched", batched_insert)]:
+        text_chunks = text_splitter.split_text(synthetic_document(PAGES, time.time_ns()))
+        index = new_index(client, f"benchmark_{name}")
+        start = time.perf_counter()
+        insert(index, text_chunks)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10}: {elapsed:.2f}s, {len(text_chunks) / elapsed:.1f} chunks/s")
+
+if __name__ == "__main__":
+    run()
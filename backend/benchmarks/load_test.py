@@ -0,0 +1,48 @@
+import argparse, statistics, time, requests
+from concurrent.futures import ThreadPoolExecutor
+
+# Run against a running backend: python -m benchmarks.load_test --token <jwt> --collection-id 1
+# Compare the output for the same server before and after a change to see the concurrent-request capacity.
+
+def timed_query(session: requests.Session, url: str, payload: dict, headers: dict):
+    start = time.perf_counter()
+    response = session.post(url, json=payload, headers=headers)
+    return time.perf_counter() - start, response.status_code
+
+def percentile(latencies: list, fraction: float):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+def run_level(args, concurrency: int):
+    url = f"{args.base_url}{args.endpoint}"
+    headers = {"Authorization": f"Bearer {args.token}"}
+    payloads = [{"collection_id": args.collection_id, "query": f"{args.query} ({i})"} for i in range(args.requests)]
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda payload: timed_query(session, url, payload, headers), payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status_code in results if status_code != 200)
+    print(f"concurrency {concurrency:>3}: {len(results) / elapsed:6.1f} req/s, "
+          f"p50 {statistics.median(latencies) * 1000:7.0f} ms, p95 {percentile(latencies, 0.95) * 1000:7.0f} ms, "
+          f"errors {errors}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/query/simple")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--collection-id", type=int, required=True)
+    parser.add_argument("--query", default="What is this document about?")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    args = parser.parse_args()
+
+    for concurrency in [int(level) for level in args.concurrency.split(",")]:
+        run_level(args, concurrency)
+
+if __name__ == "__main__":
+    main()
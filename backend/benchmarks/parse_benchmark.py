@@ -0,0 +1,27 @@
+import os, sys, tempfile, time
+from services.file_processing import FileProcess
+from benchmarks.synthetic_pdf import write_pdf
+
+# Run from the backend directory: python -m benchmarks.parse_benchmark [path/to/file.pdf]
+WORKER_COUNTS = [1, 2, 4, 8]
+PAGES = 2000
+
+def run(path: str):
+    for workers in WORKER_COUNTS:
+        file_processor = FileProcess("pdf", path, workers=workers)
+        # untimed warm-up run so process spawn time is not counted
+        sum(1 for _ in file_processor.iter_pdf_pages())
+
+        start = time.perf_counter()
+        pages = sum(1 for _ in file_processor.iter_pdf_pages())
+        elapsed = time.perf_counter() - start
+        print(f"{workers} workers: {pages} pages in {elapsed:.2f}s, {pages / elapsed:.1f} pages/s")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "synthetic.pdf")
+            write_pdf(path, PAGES)
+            run(path)
@@ -0,0 +1,73 @@
+import argparse, itertools, random, statistics, time, chromadb
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import QueryBundle
+from llama_index.core.utils import get_tokenizer
+from llama_index.vector_stores.chroma import ChromaVectorStore
+from services.rag_functionality import embed_model, build_nodes
+from services.reranker import CrossEncoderRerank
+
+# Run from the backend directory: python -m benchmarks.rerank_eval [--candidates 20] [--top-k 2]
+# Each question has exactly one chunk that answers it; the other chunks share its machine or its component,
+# which is what makes plain vector retrieval send irrelevant context.
+MACHINES = ["centrifugal pump", "air compressor", "hydraulic press", "conveyor belt", "cooling tower", "steam boiler"]
+COMPONENTS = ["bearing", "seal", "filter", "drive motor", "pressure valve", "coupling", "gasket", "sensor"]
+ACTIONS = [("inspected", "hours"), ("replaced", "months"), ("lubricated", "days"), ("calibrated", "weeks")]
+
+def synthetic_manual(rng: random.Random):
+    chunks, questions = [], []
+    for machine, component, (action, unit) in itertools.product(MACHINES, COMPONENTS, ACTIONS):
+        interval = rng.randint(2, 500)
+        chunks.append(f"Maintenance schedule for the {machine}. The {component} must be {action} every {interval} {unit}. "
+                      f"Record the date in the {machine} service log and report any wear on the {component} to the supervisor.")
+        questions.append((f"How often must the {component} of the {machine} be {action}?", len(chunks) - 1))
+    return chunks, questions
+
+def evaluate(name: str, results: list, tokenizer, latency_label: str):
+    precision = statistics.mean(sum(relevant for relevant, _ in kept) / len(kept) if kept else 0 for kept, _ in results)
+    hit_rate = statistics.mean(any(relevant for relevant, _ in kept) for kept, _ in results)
+    tokens = statistics.mean(sum(len(tokenizer(text)) for _, text in kept) for kept, _ in results)
+    latency = statistics.median(elapsed for _, elapsed in results) * 1000
+    print(f"{name:>8}: context precision {precision:.2f}, hit rate {hit_rate:.2f}, "
+          f"context tokens {tokens:.0f}, median {latency_label} {latency:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=2)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--token-budget", type=int, default=1500)
+    parser.add_argument("--model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    chunks, questions = synthetic_manual(rng)
+    nodes = build_nodes(chunks, [{"document_id": 1, "chunk_index": i, "collection_id": 1} for i in range(len(chunks))])
+    chroma_collection = chromadb.EphemeralClient().get_or_create_collection(name="rerank_eval")
+    index = VectorStoreIndex.from_vector_store(vector_store=ChromaVectorStore(chroma_collection=chroma_collection), embed_model=embed_model)
+    index.vector_store.add(nodes)
+
+    retriever = index.as_retriever(similarity_top_k=args.candidates)
+    reranker = CrossEncoderRerank(model=args.model, top_n=args.top_k, token_budget=args.token_budget, batch_size=16)
+    reranker.load()
+
+    baseline, reranked = [], []
+    for question, answer_index in rng.sample(questions, min(args.questions, len(questions))):
+        start = time.perf_counter()
+        candidates = retriever.retrieve(QueryBundle(question))
+        retrieval_seconds = time.perf_counter() - start
+        baseline.append(([(result.node.metadata["chunk_index"] == answer_index, result.node.get_content())
+                          for result in candidates[:args.top_k]], retrieval_seconds))
+
+        start = time.perf_counter()
+        kept = reranker.postprocess_nodes(candidates, QueryBundle(question))
+        reranked.append(([(result.node.metadata["chunk_index"] == answer_index, result.node.get_content())
+                          for result in kept], time.perf_counter() - start))
+
+    tokenizer = get_tokenizer()
+    print(f"{len(chunks)} chunks, {len(baseline)} questions, top-{args.top_k} of {args.candidates} candidates")
+    evaluate("vector", baseline, tokenizer, "retrieval")
+    evaluate("reranked", reranked, tokenizer, "added rerank")
+    print("reranker stats:", reranker.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse, random, statistics, tempfile, time, chromadb
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import QueryBundle, TextNode
+from llama_index.vector_stores.chroma import ChromaVectorStore
+from services.rag_functionality import embed_model, build_nodes
+from services.lexical_index import LexicalIndexes, HybridRetriever
+
+# Run from the backend directory: python -m benchmarks.retrieval_benchmark [--chunks 2000] [--scale 1000000]
+VOCABULARY = ["pump", "valve", "pressure", "seal", "housing", "bearing", "shaft", "flange", "gasket", "motor",
+              "inspection", "torque", "replacement", "maintenance", "interval", "assembly", "coupling", "sensor"]
+
+def synthetic_chunks(count: int, rng: random.Random):
+    chunks, part_numbers = [], []
+    for i in range(count):
+        part_number = f"PN-{rng.randint(100000, 999999)}-{i}"
+        words = rng.choices(VOCABULARY, k=60)
+        words.insert(rng.randint(0, 60), part_number)
+        chunks.append(" ".join(words))
+        part_numbers.append(part_number)
+    return chunks, part_numbers
+
+def measure(retriever, queries: list, targets: list):
+    hits, latencies = 0, []
+    for query, target in zip(queries, targets):
+        start = time.perf_counter()
+        results = retriever.retrieve(QueryBundle(query))
+        latencies.append(time.perf_counter() - start)
+        hits += any(result.node.metadata.get("chunk_index") == target for result in results)
+    return hits / len(queries), statistics.median(latencies) * 1000
+
+def compare(chunk_count: int, query_count: int, top_k: int, candidates: int):
+    rng = random.Random(0)
+    chunks, part_numbers = synthetic_chunks(chunk_count, rng)
+    metadatas = [{"document_id": 1, "chunk_index": i, "collection_id": 1} for i in range(chunk_count)]
+    nodes = build_nodes(chunks, metadatas)
+
+    chroma_collection = chromadb.EphemeralClient().get_or_create_collection(name="retrieval_benchmark")
+    index = VectorStoreIndex.from_vector_store(vector_store=ChromaVectorStore(chroma_collection=chroma_collection), embed_model=embed_model)
+    index.vector_store.add(nodes)
+    lexical_indexes = LexicalIndexes(tempfile.mkdtemp())
+    lexical_indexes.add(1, nodes)
+
+    targets = rng.sample(range(chunk_count), query_count)
+    queries = [f"What is the maintenance interval for part {part_numbers[target]}?" for target in targets]
+
+    vector_retriever = index.as_retriever(similarity_top_k=top_k)
+    hybrid_retriever = HybridRetriever(index.as_retriever(similarity_top_k=candidates), lexical_indexes, 1, candidates, top_k)
+    for name, retriever in [("vector", vector_retriever), ("hybrid", hybrid_retriever)]:
+        recall, latency = measure(retriever, queries, targets)
+        print(f"{name:>7}: recall@{top_k} {recall:.2f}, median latency {latency:.1f} ms")
+
+def lexical_scale(chunk_count: int, query_count: int, candidates: int):
+    rng = random.Random(1)
+    lexical_indexes = LexicalIndexes(tempfile.mkdtemp())
+    part_numbers = []
+    for start in range(0, chunk_count, 10000):
+        chunks, batch_part_numbers = synthetic_chunks(min(10000, chunk_count - start), rng)
+        part_numbers.extend(batch_part_numbers)
+        lexical_indexes.add(1, [TextNode(text=chunk, metadata={"document_id": 1, "chunk_index": start + i})
+                                for i, chunk in enumerate(chunks)])
+
+    latencies = []
+    for part_number in rng.sample(part_numbers, query_count):
+        start = time.perf_counter()
+        lexical_indexes.search(1, f"maintenance interval for part {part_number}", candidates)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"lexical search over {chunk_count} chunks: median {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=2)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--scale", type=int, default=0, help="also time lexical search over this many chunks")
+    args = parser.parse_args()
+
+    compare(args.chunks, args.queries, args.top_k, args.candidates)
+    if args.scale:
+        lexical_scale(args.scale, args.queries, args.candidates)
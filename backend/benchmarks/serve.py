@@ -0,0 +1,52 @@
+import argparse, hashlib, re
+import numpy
+from typing import List
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field
+
+# Runs the backend with a tiny offline embedding stand-in: python -m benchmarks.serve --port 8000
+# Used by benchmarks.e2e_benchmark; the HuggingFace model download and its CPU cost are kept out of the numbers
+# so changes to the rest of the pipeline show up clearly.
+
+class HashEmbedding(BaseEmbedding):
+    dimensions: int = Field(default=384, description="Length of the embedding vectors.")
+
+    @classmethod
+    def class_name(cls):
+        return "HashEmbedding"
+
+    def embed(self, text: str):
+        # bag of hashed words, so texts sharing words are still close and retrieval returns sensible chunks
+        vector = numpy.zeros(self.dimensions, dtype=numpy.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little") % self.dimensions] += 1.0
+        norm = numpy.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _get_query_embedding(self, query: str):
+        return self.embed(query)
+
+    async def _aget_query_embedding(self, query: str):
+        return self.embed(query)
+
+    def _get_text_embedding(self, text: str):
+        return self.embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]):
+        return [self.embed(text) for text in texts]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    from services import rag_functionality
+    rag_functionality.embed_model._load_model = HashEmbedding
+
+    import uvicorn
+    from main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse, subprocess, sys, time
+
+# Run from the backend directory: python -m benchmarks.startup_profile [--top 20]
+# Imports main in a fresh interpreter with -X importtime and reports where startup time goes.
+HEAVY_MODULES = ["torch", "transformers", "sentence_transformers", "chromadb", "openai", "pandas"]
+
+PROBE = f"""
+import sys, time
+start = time.perf_counter()
+import main
+print("ready", time.perf_counter() - start)
+print("heavy", ",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules))
+"""
+
+def parse_importtime(stderr: str):
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # nested imports are indented by two extra spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return imports
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        sys.exit(result.returncode)
+
+    output = dict(line.split(" ", 1) for line in result.stdout.splitlines() if line.startswith(("ready", "heavy")))
+    imports = parse_importtime(result.stderr)
+    top_level = [entry for entry in imports if entry[1] == 0]
+
+    print(f"process wall time {wall:.2f} s, main imported in {float(output['ready']):.2f} s")
+    print(f"heavy modules imported at startup: {output.get('heavy') or 'none'}")
+    print(f"\ntop {args.top} imports by cumulative time:")
+    for name, _, _, cumulative_us in sorted(top_level, key=lambda entry: entry[3], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:9.1f} ms  {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import random
+
+def page_lines(page_number: int, lines: int, rng: random.Random):
+    vocabulary = ["invoice", "contract", "clause", "party", "payment", "term", "delivery", "warranty",
+                  "liability", "notice", "schedule", "annex", "section", "amount", "period", "service"]
+    yield f"Page {page_number}"
+    for _ in range(lines):
+        yield " ".join(rng.choices(vocabulary, k=12))
+
+def write_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 0):
+    # minimal single-font PDF writer so the benchmarks do not need an extra dependency
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_number in range(1, pages + 1):
+        text = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({line}) '" for line in page_lines(page_number, lines_per_page, rng)) + " ET"
+        stream = text.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % content_id)
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    with open(path, "wb") as pdf:
+        pdf.write(b"%PDF-1.4\n")
+        offsets = []
+        for object_id, body in enumerate(objects, start=1):
+            offsets.append(pdf.tell())
+            pdf.write(b"%d 0 obj\n%s\nendobj\n" % (object_id, body))
+        xref_offset = pdf.tell()
+        pdf.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            pdf.write(b"%010d 00000 n \n" % offset)
+        pdf.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
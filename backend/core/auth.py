@@ -2,17 +2,21 @@ import bcrypt
 import jwt
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from db.database import Database
-from db.models import User
+from api.dependencies import database
+from services.tracing import span
+from services.principal_cache import principal_cache
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
-import os
+from concurrent.futures import ThreadPoolExecutor
+import os, asyncio
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 security = HTTPBearer()
-database = Database()
+# bcrypt is deliberately slow, a login burst on its own small pool cannot starve the threadpool other requests run on
+password_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")), thread_name_prefix="password-hash")
 
 def hash_password(password: str):
     password_bytes = password.encode('utf-8')
@@ -22,6 +26,12 @@ def hash_password(password: str):
 def verify_password(password: str, hashed_password: str):
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+async def ahash_password(password: str):
+    return await asyncio.get_running_loop().run_in_executor(password_executor, hash_password, password)
+
+async def averify_password(password: str, hashed_password: str):
+    return await asyncio.get_running_loop().run_in_executor(password_executor, verify_password, password, hashed_password)
+
 def create_access_token(id: int):
     payload = {
         "user_id": id,
@@ -32,13 +42,26 @@ def create_access_token(id: int):
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(database.get_db)):
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("user_id")
-        user = db.query(User).filter(User.id == user_id).first()
+        with span("auth"):
+            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=["HS256"])
+            user_id = payload.get("user_id")
+            user = principal_cache.get_user(user_id, db)
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        return user
+    except Exception as e:
+        print(f"Token validation error: {e}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+async def aget_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(database.get_async_db)):
+    try:
+        with span("auth"):
+            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=["HS256"])
+            user_id = payload.get("user_id")
+            user = await principal_cache.aget_user(user_id, db)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid token")
         return user
     except Exception as e:
         print(f"Token validation error: {e}")
         raise HTTPException(status_code=401, detail="Invalid token")
-        
\ No newline at end of file
@@ -1,16 +1,30 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 import os
 from dotenv import load_dotenv
 from db.models import Base
 
 load_dotenv()
 
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite"
+}
+
+def to_async_url(database_url: str):
+    scheme, separator, rest = database_url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
 class Database():
     def __init__(self):
         self.DATABASE_URL = os.getenv("DATABASE_URL")
+        self.ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(self.DATABASE_URL)
         self.engine = create_engine(self.DATABASE_URL)
         self.db_session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.async_engine = create_async_engine(self.ASYNC_DATABASE_URL)
+        self.async_db_session = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=self.async_engine)
 
     def get_db(self):
         db = self.db_session()
@@ -18,6 +32,14 @@ class Database():
             yield db
         finally:
             db.close()
-    
+
+    async def get_async_db(self):
+        async with self.async_db_session() as db:
+            yield db
+
     def create_tables(self):
-        Base.metadata.create_all(bind=self.engine)
\ No newline at end of file
+        Base.metadata.create_all(bind=self.engine)
+        # create_all skips tables that already exist, so indexes added to them later are created here
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=self.engine, checkfirst=True)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, LargeBinary, Index
+from sqlalchemy.orm import relationship, declarative_base, deferred
 from datetime import datetime
 
 Base = declarative_base()
@@ -26,11 +26,18 @@ class Document(Base):
     id = Column(Integer, primary_key=True)
     file_name = Column(String)
     file_type = Column(String)
-    content = Column(String)
+    # text of documents uploaded before document_contents existed, new text is stored there
+    content = deferred(Column(String))
     collection_id = Column(Integer, ForeignKey("collections.id"))
     collection = relationship("Collection", back_populates="documents")
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
+class DocumentContent(Base):
+    __tablename__ = 'document_contents'
+    document_id = Column(Integer, ForeignKey("documents.id"), primary_key=True)
+    data = Column(LargeBinary)
+    size = Column(Integer)
+
 class ChatHistory(Base):
     __tablename__ = 'chat_history'
     id = Column(Integer, primary_key=True)
@@ -41,6 +48,45 @@ class ChatHistory(Base):
     submitted_at = Column(DateTime, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (Index("ix_chat_history_user_collection_created", "user_id", "collection_id", "created_at"),)
+
+class ChatSummary(Base):
+    __tablename__ = 'chat_summaries'
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    collection_id = Column(Integer, ForeignKey("collections.id"), primary_key=True)
+    summary = Column(String)
+    summarized_through_id = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CollectionChunking(Base):
+    __tablename__ = 'collection_chunking'
+    collection_id = Column(Integer, ForeignKey("collections.id"), primary_key=True)
+    file_type = Column(String, primary_key=True)
+    strategy = Column(String)
+
+class CollectionVersion(Base):
+    __tablename__ = 'collection_versions'
+    collection_id = Column(Integer, ForeignKey("collections.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class IngestionJobRecord(Base):
+    __tablename__ = 'ingestion_jobs'
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    collection_id = Column(Integer)
+    file_name = Column(String)
+    status = Column(String)
+    error = Column(String)
+    document_id = Column(Integer)
+    chunk_count = Column(Integer, default=0)
+    changed_chunk_count = Column(Integer, default=0)
+    # hostname:pid of the process holding the job in memory, and where its upload is spooled
+    worker = Column(String)
+    spool_path = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
 class IndexedCollection(Base):
     __tablename__ = 'indexed_collections'
     
@@ -1,14 +1,24 @@
-from fastapi import FastAPI
+import time
+started_at = time.perf_counter()
+
+from fastapi import FastAPI, Request
 from dotenv import load_dotenv
-import os
-from services.rag_functionality import load_indexed_collections
+import os, threading
+from services.index_registry import peak_rss_mb
+from services.rag_functionality import warm_up
+from services.tracing import setup_tracing, start_request, new_request_id, server_timing, REQUEST_SECONDS
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from fastapi.responses import Response
+from services.ingestion import ingestion_queue
 from db.models import AdminSettings
 from api.dependencies import database
 from api.routers import authentication, user, collections, documents, chat, admin
 
 load_dotenv()
+setup_tracing("ragility-backend")
 app = FastAPI()
 database.create_tables()
+ingestion_queue.start(database.db_session)
 
 app.include_router(authentication.router)
 app.include_router(user.router)
@@ -20,7 +30,6 @@ app.include_router(admin.router)
 
 db = database.db_session()
 try:
-    load_indexed_collections(db)
     existing_model_setting = db.query(AdminSettings).filter(AdminSettings.setting_key == "openai_model").first()
     if not existing_model_setting:
         default_model = AdminSettings(setting_key="openai_model",setting_value=os.getenv("OPENAI_MODEL"))
@@ -29,6 +38,33 @@ try:
 finally:
     db.close()
 
+# collection indexes are opened on first use, so startup cost no longer grows with the number of collections
+app.state.startup_seconds = round(time.perf_counter() - started_at, 2)
+app.state.startup_rss_mb = peak_rss_mb()
+
+if os.getenv("WARM_UP_MODELS", "false").lower() == "true":
+    # requests are served while the embedding model and Chroma load in the background
+    threading.Thread(target=warm_up, daemon=True).start()
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    request_id = new_request_id(request.headers.get("X-Request-ID"))
+    request_started_at = time.perf_counter()
+    with start_request(request_id, f"{request.method} {request.url.path}") as stages:
+        response = await call_next(request)
+
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched", response.status_code).observe(time.perf_counter() - request_started_at)
+    response.headers["X-Request-ID"] = request_id
+    # per-stage breakdown of this request, shown in the browser devtools timing tab
+    if stages:
+        response.headers["Server-Timing"] = server_timing(stages)
+    return response
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/")
 def root():
@@ -0,0 +1,206 @@
+import os, re, hashlib
+import numpy
+import xml.etree.ElementTree as ElementTree
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+from llama_index.core.node_parser import SentenceSplitter, TokenTextSplitter
+from llama_index.core.utils import get_tokenizer
+from services.file_processing import PAGE_BREAK
+
+load_dotenv()
+chunk_size = int(os.getenv("CHUNK_SIZE", "512"))
+chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "70"))
+chunk_dedup_distance = int(os.getenv("CHUNK_DEDUP_DISTANCE", "3"))
+chunk_dedup_similarity = float(os.getenv("CHUNK_DEDUP_SIMILARITY", "0.9"))
+HEADING = re.compile(r"^(\d+(\.\d+)*\.?\s+[A-Z].{0,80}|[A-Z][A-Z0-9 ,&:/()-]{3,80})$")
+
+def count_tokens(text: str):
+    return len(get_tokenizer()(text))
+
+def kept(chunks: list, keep=None):
+    return [chunk for chunk in chunks if chunk.strip() and (keep is None or keep(chunk))]
+
+class SentenceChunker:
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def split(self, text: str, keep=None):
+        return kept(self.splitter.split_text(text), keep)
+
+class TokenChunker:
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.splitter = TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def split(self, text: str, keep=None):
+        return kept(self.splitter.split_text(text), keep)
+
+class StructuredChunker(ABC):
+    # structure boundaries replace overlap: units are packed whole and only an oversized unit is cut by tokens
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.oversized_splitter = TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+
+    @abstractmethod
+    def units(self, text: str):
+        pass
+
+    def header(self, text: str):
+        return ""
+
+    def pack(self, units: list, header: str = ""):
+        budget = self.chunk_size - (count_tokens(header) if header else 0)
+        chunks, current, current_tokens = [], [], 0
+        for unit in units:
+            tokens = count_tokens(unit)
+            if current and current_tokens + tokens > budget:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            if tokens > budget:
+                chunks.extend([piece] for piece in self.oversized_splitter.split_text(unit))
+                continue
+            current.append(unit)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return ["\n".join([header, *chunk] if header else chunk) for chunk in chunks]
+
+    def split(self, text: str, keep=None):
+        return kept(self.pack(self.units(text), self.header(text)), keep)
+
+class CsvRowChunker(StructuredChunker):
+    def lines(self, text: str):
+        return [line for line in text.splitlines() if line.strip()]
+
+    def header(self, text: str):
+        # the header line is repeated in every row group so each chunk can be read on its own
+        lines = self.lines(text)
+        return lines[0] if len(lines) >= 2 else ""
+
+    def units(self, text: str):
+        lines = self.lines(text)
+        return lines[1:] if len(lines) >= 2 else lines
+
+class XmlElementChunker(StructuredChunker):
+    def describe(self, element):
+        lines = []
+        for node in element.iter():
+            node_text = (node.text or "").strip()
+            attributes = " ".join(f'{name}="{value}"' for name, value in node.attrib.items())
+            if node_text or attributes:
+                line = f"{node.tag} [{attributes}]" if attributes else node.tag
+                lines.append(f"{line}: {node_text}" if node_text else line)
+        return "\n".join(lines)
+
+    def units(self, text: str):
+        root = ElementTree.fromstring(text)
+        # wrapper elements with a single child do not mark record boundaries, the level below them does
+        while len(root) == 1 and len(root[0]):
+            root = root[0]
+        return [description for description in (self.describe(element) for element in root) if description] \
+            or [self.describe(root)]
+
+    def split(self, text: str, keep=None):
+        try:
+            return kept(self.pack(self.units(text)), keep)
+        except ElementTree.ParseError:
+            return kept(self.pack(text.split("\n\n")), keep)
+
+class PdfSectionChunker(StructuredChunker):
+    def units(self, text: str):
+        # a heading starts a new section; sections are packed within a page and never span pages
+        sections, current = [], []
+        for line in text.splitlines():
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if current and HEADING.match(stripped) and not stripped.endswith("."):
+                sections.append("\n".join(current))
+                current = []
+            current.append(stripped)
+        if current:
+            sections.append("\n".join(current))
+        return sections
+
+    def split(self, text: str, keep=None):
+        # boilerplate repeated on every page usually sits in its own section, so it is dropped before packing
+        return self.pack(kept(self.units(text), keep))
+
+CHUNKERS = {
+    "sentence": SentenceChunker(chunk_size, chunk_overlap),
+    "token": TokenChunker(chunk_size, chunk_overlap),
+    "csv_rows": CsvRowChunker(chunk_size),
+    "xml_elements": XmlElementChunker(chunk_size),
+    "pdf_sections": PdfSectionChunker(chunk_size)
+}
+
+def parse_strategies(value: str):
+    strategies = dict(entry.split(":", 1) for entry in value.split(",") if entry)
+    unknown = set(strategies.values()) - CHUNKERS.keys()
+    if unknown:
+        raise ValueError(f"Unknown chunking strategies: {', '.join(sorted(unknown))}")
+    return strategies
+
+default_strategies = parse_strategies(os.getenv("CHUNKING_STRATEGIES", "csv:csv_rows,xml:xml_elements,pdf:pdf_sections,txt:sentence"))
+
+def document_pages(file_type: str, content: str):
+    if file_type == "pdf":
+        return list(enumerate(content.split(PAGE_BREAK), start=1))
+    return [(None, content)]
+
+NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+def shingle_set(text: str):
+    words = re.findall(r"\w+", text.lower())
+    # a set, so markup or column names repeated in every record do not outweigh the values that differ
+    return {" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
+
+def simhash(shingles: set):
+    hashes = numpy.array([int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little")
+                          for shingle in shingles], dtype=numpy.uint64)
+    bits = numpy.unpackbits(hashes.view(numpy.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    weights = (bits.astype(numpy.int32) * 2 - 1).sum(axis=0)
+    return int.from_bytes(numpy.packbits(weights > 0, bitorder="little").tobytes(), "little")
+
+class ChunkDeduplicator:
+    def __init__(self, max_distance: int, min_similarity: float):
+        self.max_distance = max_distance
+        self.min_similarity = min_similarity
+        # split into max_distance + 1 bands, two fingerprints within max_distance bits share at least one band exactly
+        self.band_count = max_distance + 1
+        self.band_width = 64 // self.band_count
+        self.bands = [{} for _ in range(self.band_count)]
+        self.duplicates = 0
+
+    def band_values(self, fingerprint: int):
+        mask = (1 << self.band_width) - 1
+        return [(fingerprint >> (band * self.band_width)) & mask for band in range(self.band_count)]
+
+    def is_duplicate(self, shingles: set, numbers: list, other: tuple):
+        # simhash only nominates candidates: chunks that differ in one figure (an interval, a price) hash a few bits
+        # apart, so a candidate must also share nearly all its shingles and carry exactly the same numbers
+        _, other_shingles, other_numbers = other
+        return numbers == other_numbers and \
+            len(shingles & other_shingles) >= self.min_similarity * len(shingles | other_shingles)
+
+    def seen(self, text: str):
+        shingles = shingle_set(text)
+        numbers = NUMBER.findall(text)
+        fingerprint = simhash(shingles)
+        band_values = self.band_values(fingerprint)
+        for band, value in zip(self.bands, band_values):
+            for other in band.get(value, ()):
+                if bin(fingerprint ^ other[0]).count("1") <= self.max_distance and self.is_duplicate(shingles, numbers, other):
+                    self.duplicates += 1
+                    return True
+        entry = (fingerprint, shingles, numbers)
+        for band, value in zip(self.bands, band_values):
+            band.setdefault(value, []).append(entry)
+        return False
+
+def iter_chunks(strategy: str, pages, deduplicate: bool = True):
+    chunker = CHUNKERS[strategy]
+    deduplicator = ChunkDeduplicator(chunk_dedup_distance, chunk_dedup_similarity) if deduplicate and chunk_dedup_distance >= 0 else None
+    keep = (lambda text: not deduplicator.seen(text)) if deduplicator else None
+    for page_number, page_text in pages:
+        for chunk in chunker.split(page_text, keep):
+            yield page_number, chunk
@@ -0,0 +1,58 @@
+import os
+from dotenv import load_dotenv
+from llama_index.core.utils import get_tokenizer
+
+load_dotenv()
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an assistant about their documents.
+Keep facts, names, numbers and open questions the user may refer back to. Answer with the summary only, in at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}"""
+
+class ConversationMemory:
+    def __init__(self, token_budget: int, max_turns: int, summary_max_words: int):
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.summary_max_words = summary_max_words
+
+    def count_tokens(self, text: str):
+        return len(get_tokenizer()(text))
+
+    def format_turn(self, turn):
+        return [f"Human: {turn.query}", f"Assistant: {turn.response}"]
+
+    def split_turns(self, turns: list):
+        # turns come newest first; the newest ones that fit the budget are sent verbatim, the rest belong in the summary
+        used_tokens = 0
+        recent = []
+        for turn in turns:
+            tokens = self.count_tokens("\n".join(self.format_turn(turn)))
+            if used_tokens + tokens > self.token_budget:
+                break
+            used_tokens += tokens
+            recent.append(turn)
+        return list(reversed(recent)), list(reversed(turns[len(recent):]))
+
+    def build_context(self, turns: list, summary: str = None):
+        recent, _ = self.split_turns(turns)
+        context_messages = [f"Summary of earlier conversation: {summary}"] if summary else []
+        for turn in recent:
+            context_messages.extend(self.format_turn(turn))
+        return context_messages
+
+    def pending_turns(self, turns: list, summarized_through_id: int = None):
+        _, older = self.split_turns(turns)
+        return [turn for turn in older if turn.id > (summarized_through_id or 0)]
+
+    def summarize(self, llm, summary: str, turns: list):
+        prompt = SUMMARY_PROMPT.format(max_words=self.summary_max_words, summary=summary or "(empty)",
+                                       turns="\n".join(message for turn in turns for message in self.format_turn(turn)))
+        return llm.complete(prompt).text.strip()
+
+conversation_memory = ConversationMemory(int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500")),
+                                         int(os.getenv("CHAT_HISTORY_MAX_TURNS", "50")),
+                                         int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "150")))
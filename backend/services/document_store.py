@@ -0,0 +1,29 @@
+import zlib
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import Document, DocumentContent
+
+def compress_text(text: str):
+    return zlib.compress(text.encode("utf-8"))
+
+def decompress_text(data: bytes):
+    return zlib.decompress(data).decode("utf-8")
+
+def save_document_content(document_id: int, text: str, db: Session):
+    if text is None:
+        db.execute(delete(DocumentContent).where(DocumentContent.document_id == document_id))
+    else:
+        db.merge(DocumentContent(document_id=document_id, data=compress_text(text), size=len(text)))
+
+def load_document_content(document_id: int, db: Session):
+    data = db.scalar(select(DocumentContent.data).where(DocumentContent.document_id == document_id))
+    if data is not None:
+        return decompress_text(data)
+    return db.scalar(select(Document.content).where(Document.id == document_id))
+
+async def aload_document_content(document_id: int, db: AsyncSession):
+    data = await db.scalar(select(DocumentContent.data).where(DocumentContent.document_id == document_id))
+    if data is not None:
+        return decompress_text(data)
+    return await db.scalar(select(Document.content).where(Document.id == document_id))
@@ -0,0 +1,162 @@
+import sqlite3, hashlib, threading, time, asyncio
+from array import array
+from typing import List
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+class EmbeddingCache:
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+            model_name TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (model_name, text_hash))""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self.connection.commit()
+        self.size = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def hash_text(text: str):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model_name: str, text_hashes: List[str]):
+        found = {}
+        with self.lock:
+            for start in range(0, len(text_hashes), 500):
+                batch = text_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.connection.execute(
+                    f"SELECT text_hash, embedding FROM embeddings WHERE model_name = ? AND text_hash IN ({placeholders})",
+                    [model_name, *batch]).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+
+            if found:
+                now = time.time()
+                self.connection.executemany("UPDATE embeddings SET last_used = ? WHERE model_name = ? AND text_hash = ?",
+                                            [(now, model_name, text_hash) for text_hash in found])
+                self.connection.commit()
+
+            self.hits += len(found)
+            self.misses += len(set(text_hashes)) - len(found)
+        return found
+
+    def put_many(self, model_name: str, items: dict):
+        if not items:
+            return
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (model_name, text_hash, embedding, last_used) VALUES (?, ?, ?, ?)",
+                [(model_name, text_hash, array("f", embedding).tobytes(), now) for text_hash, embedding in items.items()])
+            self.size += cursor.rowcount
+            if self.size > self.max_entries:
+                self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        # evict a tenth of the cache at once so we do not run a DELETE after every insert
+        overflow = self.size - self.max_entries + self.max_entries // 10
+        self.connection.execute("DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                                (overflow,))
+        self.size = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self.size,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+class CachedEmbedding(BaseEmbedding):
+    _load_model = PrivateAttr()
+    _embed_model: BaseEmbedding = PrivateAttr(default=None)
+    _load_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, load_model, cache: EmbeddingCache, model_name: str, embed_batch_size: int):
+        super().__init__(model_name=model_name, embed_batch_size=embed_batch_size)
+        self._load_model = load_model
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    @property
+    def loaded(self):
+        return self._embed_model is not None
+
+    def load(self):
+        # the wrapped model is only built on the first cache miss, so startup does not pay for it
+        with self._load_lock:
+            if self._embed_model is None:
+                self._embed_model = self._load_model()
+            return self._embed_model
+
+    def _get_query_embedding(self, query: str):
+        # queries get a separate key because some models prepend a query instruction
+        text_hash = self._cache.hash_text(f"query:{query}")
+        cached = self._cache.get_many(self.model_name, [text_hash])
+        if text_hash in cached:
+            return cached[text_hash]
+
+        embedding = self.load().get_query_embedding(query)
+        self._cache.put_many(self.model_name, {text_hash: embedding})
+        return embedding
+
+    async def _aget_query_embedding(self, query: str):
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def get_query_embedding_batch(self, queries: List[str]):
+        query_hashes = [self._cache.hash_text(f"query:{query}") for query in queries]
+        cached = self._cache.get_many(self.model_name, query_hashes)
+
+        missing = {}
+        for query, query_hash in zip(queries, query_hashes):
+            if query_hash not in cached and query_hash not in missing:
+                missing[query_hash] = query
+
+        if missing:
+            model = self.load()
+            if hasattr(model, "_embed"):
+                # HuggingFaceEmbedding has no public batch call for queries, _embed applies the query prompt to a whole list
+                embeddings = model._embed(list(missing.values()), prompt_name="query")
+            else:
+                embeddings = [model.get_query_embedding(query) for query in missing.values()]
+            new_embeddings = dict(zip(missing.keys(), embeddings))
+            self._cache.put_many(self.model_name, new_embeddings)
+            cached.update(new_embeddings)
+
+        return [cached[query_hash] for query_hash in query_hashes]
+
+    def _get_text_embedding(self, text: str):
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]):
+        text_hashes = [self._cache.hash_text(text) for text in texts]
+        cached = self._cache.get_many(self.model_name, text_hashes)
+
+        missing = {}
+        for text, text_hash in zip(texts, text_hashes):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+
+        if missing:
+            embeddings = self.load().get_text_embedding_batch(list(missing.values()))
+            new_embeddings = dict(zip(missing.keys(), embeddings))
+            self._cache.put_many(self.model_name, new_embeddings)
+            cached.update(new_embeddings)
+
+        return [cached[text_hash] for text_hash in text_hashes]
@@ -1,10 +1,65 @@
-import pandas
 import io
+import os
+import math
+import shutil
+import tempfile
+import threading
+import multiprocessing
 import PyPDF2
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+parse_workers = int(os.getenv("PARSE_WORKERS", "1"))
+# pages of an extracted PDF are joined with a form feed, so chunking can still tell where each page starts
+PAGE_BREAK = "\f"
+parse_pools = {}
+parse_pools_lock = threading.Lock()
+
+def get_parse_pool(workers: int):
+    with parse_pools_lock:
+        if workers not in parse_pools:
+            # spawn so the workers do not inherit the server's threads and loaded models
+            parse_pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return parse_pools[workers]
+
+def open_source(content):
+    if isinstance(content, str):
+        return open(content, 'rb')
+    return io.BytesIO(content)
+
+def extract_pdf_page_range(path: str, start: int, end: int):
+    with open(path, 'rb') as stream:
+        pdf_reader = PyPDF2.PdfReader(stream)
+        return [pdf_reader.pages[i].extract_text() for i in range(start, end)]
+
+def parse_csv(content):
+    # pandas is only imported once a CSV is uploaded, it adds noticeably to startup
+    import pandas
+    with open_source(content) as stream:
+        result = pandas.read_csv(stream, encoding='UTF-8')
+    return result.to_string(index=False)
+
+def spool_upload(file, threshold: int):
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    if size <= threshold:
+        return file.read()
+
+    with tempfile.NamedTemporaryFile(delete=False, prefix="upload_") as spooled:
+        shutil.copyfileobj(file, spooled)
+    return spooled.name
+
+def discard_spooled(content):
+    if isinstance(content, str) and os.path.exists(content):
+        os.remove(content)
 
 class FileProcess:
-    def __init__(self, file_extension, content):
+    def __init__(self, file_extension, content, workers=parse_workers):
         self.file_extension = file_extension
+        self.workers = workers
+        # content is either the raw bytes or the path of an upload spooled to disk
         self.content = content
         self.extensions = {
             'pdf': self.process_pdf,
@@ -16,25 +71,65 @@ class FileProcess:
 
     def get_extensions(self):
         return self.extensions
-    
+
+    def open_content(self):
+        return open_source(self.content)
+
+    def use_pool(self):
+        # only uploads spooled to disk are worth it, small ones would spend longer pickling bytes to the workers
+        return self.workers > 1 and isinstance(self.content, str)
+
+    def read_content(self):
+        with self.open_content() as stream:
+            return stream.read()
+
     def process_pdf(self):
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(self.content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
-    
+        return PAGE_BREAK.join(text for _, text in self.iter_pdf_pages())
+
+    def iter_pdf_pages(self):
+        if self.use_pool():
+            yield from self.iter_pdf_pages_parallel()
+            return
+
+        with self.open_content() as stream:
+            pdf_reader = PyPDF2.PdfReader(stream)
+            for page_number, page in enumerate(pdf_reader.pages, start=1):
+                yield page_number, page.extract_text()
+
+    def iter_pdf_pages_parallel(self):
+        with self.open_content() as stream:
+            page_count = len(PyPDF2.PdfReader(stream).pages)
+        if not page_count:
+            return
+
+        # one contiguous range per worker, every task has to parse the document structure again
+        pages_per_task = math.ceil(page_count / self.workers)
+        starts = range(0, page_count, pages_per_task)
+        ends = [min(start + pages_per_task, page_count) for start in starts]
+
+        pool = get_parse_pool(self.workers)
+        page_number = 1
+        for page_texts in pool.map(extract_pdf_page_range, [self.content] * len(starts), starts, ends):
+            for text in page_texts:
+                yield page_number, text
+                page_number += 1
+
     def process_xml(self):
-        return self.content.decode('UTF-8')
-    
+        return self.read_content().decode('UTF-8')
+
     def process_csv(self):
-        csv_string = self.content.decode('UTF-8')
-        csv_io = io.StringIO(csv_string)
-        result = pandas.read_csv(csv_io)
-        return result.to_string(index=False)
-    
+        if self.use_pool():
+            return get_parse_pool(self.workers).submit(parse_csv, self.content).result()
+        return parse_csv(self.content)
+
     def process_txt(self):
-        return self.content.decode('UTF-8')
-    
+        return self.read_content().decode('UTF-8')
+
     def process_file(self):
         return self.process()
+
+    def iter_pages(self):
+        if self.file_extension == 'pdf':
+            yield from self.iter_pdf_pages()
+        else:
+            yield 1, self.process()
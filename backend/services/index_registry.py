@@ -0,0 +1,122 @@
+import sys, threading, time
+from collections import OrderedDict, Counter
+from contextlib import contextmanager
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class IndexRegistry:
+    def __init__(self, open_index, max_loaded: int):
+        self.open_index = open_index
+        self.max_loaded = max_loaded
+        self.indexes = OrderedDict()
+        self.collection_locks = {}
+        self.in_use = Counter()
+        self.removing = set()
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def _checkout_loaded(self, collection_id: int):
+        index = self.indexes.get(collection_id)
+        if index is not None:
+            self.indexes.move_to_end(collection_id)
+            self.in_use[collection_id] += 1
+            self.hits += 1
+        return index
+
+    def _evict(self):
+        # indexes with queries in flight are skipped, so the LRU can briefly run over max_loaded
+        for collection_id in list(self.indexes):
+            if len(self.indexes) <= self.max_loaded:
+                break
+            if not self.in_use[collection_id]:
+                del self.indexes[collection_id]
+                self.evictions += 1
+
+    def checkout(self, collection_id: int, resolve=None):
+        with self.lock:
+            if collection_id in self.removing:
+                return None
+            index = self._checkout_loaded(collection_id)
+            if index is not None or resolve is None:
+                return index
+            collection_lock = self.collection_locks.setdefault(collection_id, threading.Lock())
+
+        # one loader per collection, concurrent requests for the same collection wait and reuse its index
+        with collection_lock:
+            with self.lock:
+                if collection_id in self.removing:
+                    return None
+                index = self._checkout_loaded(collection_id)
+            if index is not None:
+                return index
+
+            chroma_collection_name = resolve()
+            if chroma_collection_name is None:
+                return None
+            start = time.perf_counter()
+            index = self.open_index(chroma_collection_name)
+
+            with self.lock:
+                if collection_id in self.removing:
+                    return None
+                self.loads += 1
+                self.load_seconds += time.perf_counter() - start
+                self.indexes[collection_id] = index
+                self.in_use[collection_id] += 1
+                self._evict()
+            return index
+
+    def release(self, collection_id: int):
+        with self.lock:
+            self.in_use[collection_id] -= 1
+            if not self.in_use[collection_id]:
+                del self.in_use[collection_id]
+                self.released.notify_all()
+
+    @contextmanager
+    def use(self, collection_id: int, resolve=None):
+        index = self.checkout(collection_id, resolve)
+        try:
+            yield index
+        finally:
+            if index is not None:
+                self.release(collection_id)
+
+    def begin_removal(self, collection_id: int, timeout: float = 30.0):
+        # new checkouts see the collection as missing while in-flight ones finish before it is deleted
+        # returns False, with the collection usable again, when the in-flight ones do not finish within timeout
+        with self.lock:
+            self.removing.add(collection_id)
+            if not self.released.wait_for(lambda: not self.in_use[collection_id], timeout=timeout):
+                self.removing.discard(collection_id)
+                return False
+            self.indexes.pop(collection_id, None)
+            return True
+
+    def end_removal(self, collection_id: int):
+        with self.lock:
+            self.removing.discard(collection_id)
+            self.collection_locks.pop(collection_id, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "loaded": len(self.indexes),
+                "max_loaded": self.max_loaded,
+                "in_use": sum(self.in_use.values()),
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "average_load_ms": round(self.load_seconds / self.loads * 1000, 1) if self.loads else 0.0
+            }
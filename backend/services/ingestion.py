@@ -0,0 +1,245 @@
+import os, queue, socket, threading, time, uuid
+from datetime import timedelta
+from datetime import datetime
+from dotenv import load_dotenv
+from sqlalchemy import delete
+from db.models import Document, DocumentContent, IngestionJobRecord
+from services.file_processing import FileProcess, discard_spooled
+from services.document_store import save_document_content
+from services.rag_functionality import index_document, index_pages, reindex_document, use_collection_index, remove_document_chunks, invalidate_responses
+
+load_dotenv()
+ingestion_workers = int(os.getenv("INGESTION_WORKERS", "2"))
+ingestion_queue_size = int(os.getenv("INGESTION_QUEUE_SIZE", "100"))
+ingestion_job_ttl = int(os.getenv("INGESTION_JOB_TTL", "3600"))
+upload_spool_threshold = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(10 * 1024 * 1024)))
+stream_pdf_pages = os.getenv("STREAM_PDF_PAGES", "false").lower() == "true"
+worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+def worker_stopped(worker: str):
+    hostname, _, pid = (worker or "").rpartition(":")
+    # processes on other hosts cannot be checked from here, their own restart recovers them
+    if hostname != socket.gethostname():
+        return False
+    # a container restart can give this process the pid of its previous life
+    if worker == worker_id:
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except (PermissionError, ValueError):
+        return False
+    return False
+
+def job_status(record: IngestionJobRecord):
+    return {
+        "job_id": record.id,
+        "status": record.status,
+        "collection_id": record.collection_id,
+        "file_name": record.file_name,
+        "document_id": record.document_id,
+        "chunk_count": record.chunk_count,
+        "changed_chunk_count": record.changed_chunk_count,
+        "error": record.error,
+        "created_at": record.created_at,
+        "started_at": record.started_at,
+        "finished_at": record.finished_at
+    }
+
+class IngestionJob:
+    def __init__(self, user_id, collection_id, file_name, file_extension, content, replace_document_id=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.collection_id = collection_id
+        self.file_name = file_name
+        self.file_extension = file_extension
+        self.content = content
+        self.replace_document_id = replace_document_id
+        self.status = "queued"
+        self.error = None
+        self.document_id = None
+        self.chunk_count = 0
+        self.changed_chunk_count = 0
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+
+    def record(self):
+        return IngestionJobRecord(id=self.id, user_id=self.user_id, collection_id=self.collection_id, file_name=self.file_name,
+                                  status=self.status, error=self.error, document_id=self.document_id,
+                                  chunk_count=self.chunk_count, changed_chunk_count=self.changed_chunk_count, worker=worker_id,
+                                  spool_path=self.content if isinstance(self.content, str) else None,
+                                  created_at=self.created_at, started_at=self.started_at, finished_at=self.finished_at)
+
+class IngestionQueue:
+    def __init__(self, workers, max_size, job_ttl):
+        self.workers = workers
+        self.job_ttl = job_ttl
+        self.queue = queue.Queue(maxsize=max_size)
+        self.lock = threading.Lock()
+        self.threads = []
+        self.session_factory = None
+        self.completed_documents = 0
+        self.completed_chunks = 0
+        self.failed_documents = 0
+        self.busy_seconds = 0.0
+
+    def start(self, session_factory):
+        self.session_factory = session_factory
+        self.recover_interrupted()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingestion-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def recover_interrupted(self):
+        # queued and running jobs only live in the memory of their worker process; when it is gone they never finish
+        db = self.session_factory()
+        try:
+            records = db.query(IngestionJobRecord).filter(IngestionJobRecord.status.in_(["queued", "processing"])).all()
+            for record in records:
+                if worker_stopped(record.worker):
+                    record.status = "failed"
+                    record.error = "Interrupted by a server restart, upload the file again"
+                    record.finished_at = datetime.utcnow()
+                    discard_spooled(record.spool_path)
+            db.commit()
+        finally:
+            db.close()
+
+    def _save(self, job: IngestionJob):
+        # job status is kept in the database so any worker process can answer a poll for it
+        db = self.session_factory()
+        try:
+            db.merge(job.record())
+            db.commit()
+        finally:
+            db.close()
+
+    def submit(self, job: IngestionJob):
+        db = self.session_factory()
+        try:
+            db.query(IngestionJobRecord).filter(IngestionJobRecord.finished_at < datetime.utcnow() - timedelta(seconds=self.job_ttl)) \
+                .delete(synchronize_session=False)
+            db.add(job.record())
+            db.commit()
+        finally:
+            db.close()
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            db = self.session_factory()
+            try:
+                db.query(IngestionJobRecord).filter(IngestionJobRecord.id == job.id).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+            raise
+        return job
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self._run(job)
+            except Exception as e:
+                print(f"Ingestion job {job.id} could not record its status: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _run(self, job: IngestionJob):
+        job.status = "processing"
+        job.started_at = datetime.utcnow()
+        start = time.perf_counter()
+        db = self.session_factory()
+        try:
+            self._save(job)
+            file_processor = FileProcess(job.file_extension, job.content)
+            # in streaming mode pages go straight into chunking and embedding, so the full text is never stored
+            streaming = stream_pdf_pages and job.file_extension == "pdf"
+            processed_content = None if streaming else file_processor.process_file()
+
+            if job.replace_document_id:
+                document = db.get(Document, job.replace_document_id)
+                if document is None:
+                    raise ValueError("Document not found")
+                document.file_name = job.file_name
+                document.file_type = job.file_extension
+                document.content = None
+                document.uploaded_at = datetime.utcnow()
+            else:
+                document = Document(
+                    file_name=job.file_name,
+                    file_type=job.file_extension,
+                    collection_id=job.collection_id
+                )
+                db.add(document)
+                db.flush()
+
+            save_document_content(document.id, processed_content, db)
+            db.commit()
+            job.document_id = document.id
+            if streaming:
+                job.chunk_count = index_pages(document, file_processor.iter_pages(), db, replace=bool(job.replace_document_id))
+                job.changed_chunk_count = job.chunk_count
+            elif job.replace_document_id:
+                job.chunk_count, job.changed_chunk_count = reindex_document(document, processed_content, db)
+            else:
+                job.chunk_count = index_document(document, processed_content, db)
+                job.changed_chunk_count = job.chunk_count
+            job.status = "completed"
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            # the row and content of a new upload are committed before indexing, a failed one must not stay listed
+            if job.document_id and not job.replace_document_id:
+                try:
+                    self._discard_document(job.document_id, job.collection_id, db)
+                    job.document_id = None
+                except Exception as cleanup_error:
+                    db.rollback()
+                    job.error = f"{job.error} (cleanup failed: {cleanup_error})"
+        finally:
+            db.close()
+            discard_spooled(job.content)
+            job.content = None
+            job.finished_at = datetime.utcnow()
+        self._save(job)
+
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.busy_seconds += elapsed
+            if job.status == "completed":
+                self.completed_documents += 1
+                self.completed_chunks += job.chunk_count
+            else:
+                self.failed_documents += 1
+
+    def _discard_document(self, document_id: int, collection_id: int, db):
+        # a streamed PDF may have written some batches of chunks before failing
+        with use_collection_index(collection_id, db) as index:
+            if index is not None:
+                remove_document_chunks(index, collection_id, document_id)
+        db.execute(delete(DocumentContent).where(DocumentContent.document_id == document_id))
+        db.execute(delete(Document).where(Document.id == document_id))
+        db.commit()
+        invalidate_responses(collection_id, db)
+
+    def metrics(self):
+        with self.lock:
+            # busy_seconds is summed across workers, so scale it back to wall-clock pool time
+            pool_seconds = self.busy_seconds / self.workers if self.workers else 0
+            return {
+                "workers": self.workers,
+                "queued": self.queue.qsize(),
+                "max_queue_size": self.queue.maxsize,
+                "completed_documents": self.completed_documents,
+                "completed_chunks": self.completed_chunks,
+                "failed_documents": self.failed_documents,
+                "docs_per_second": self.completed_documents / pool_seconds if pool_seconds else 0.0,
+                "chunks_per_second": self.completed_chunks / pool_seconds if pool_seconds else 0.0
+            }
+
+ingestion_queue = IngestionQueue(ingestion_workers, ingestion_queue_size, ingestion_job_ttl)
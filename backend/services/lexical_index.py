@@ -0,0 +1,180 @@
+import os, re, sqlite3, threading
+from collections import Counter
+from typing import List
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import TextNode, NodeWithScore, QueryBundle
+from services.tracing import span
+
+TOKEN_PATTERN = re.compile(r"[\w\-]+")
+
+class LexicalIndexes:
+    def __init__(self, path: str, max_document_frequency: float = 0.05):
+        self.path = path
+        self.max_document_frequency = max_document_frequency
+        self.connections = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _connection(self, collection_id: int):
+        with self.lock:
+            if collection_id not in self.connections:
+                connection = sqlite3.connect(os.path.join(self.path, f"collection_{collection_id}.sqlite3"), check_same_thread=False)
+                connection.execute("PRAGMA journal_mode=WAL")
+                # FTS5 keeps a BM25-ranked inverted index; '-' and '_' stay inside tokens so part numbers match whole.
+                # Terms are not stemmed so they can be counted as-is in term_frequency.
+                connection.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+                    node_id UNINDEXED, document_id UNINDEXED, chunk_index UNINDEXED, page_number UNINDEXED, text,
+                    tokenize = "unicode61 tokenchars '-_'")""")
+                connection.execute("CREATE TABLE IF NOT EXISTS term_frequency (term TEXT PRIMARY KEY, chunks INTEGER NOT NULL) WITHOUT ROWID")
+                connection.execute("CREATE TABLE IF NOT EXISTS chunk_count (id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER NOT NULL)")
+                connection.execute("INSERT OR IGNORE INTO chunk_count (id, total) VALUES (1, 0)")
+                # maps node ids to FTS rowids so single documents can be deleted without scanning the FTS table
+                connection.execute("CREATE TABLE IF NOT EXISTS chunk_nodes (rowid INTEGER PRIMARY KEY, node_id TEXT NOT NULL UNIQUE)")
+                if not connection.execute("SELECT 1 FROM chunk_nodes LIMIT 1").fetchone():
+                    connection.execute("INSERT INTO chunk_nodes (rowid, node_id) SELECT rowid, node_id FROM chunks")
+                connection.commit()
+                self.connections[collection_id] = connection
+                self.locks[collection_id] = threading.Lock()
+            return self.connections[collection_id], self.locks[collection_id]
+
+    def add(self, collection_id: int, nodes: list):
+        connection, lock = self._connection(collection_id)
+        rows = [(node.node_id, node.metadata.get("document_id"), node.metadata.get("chunk_index"),
+                 node.metadata.get("page_number"), node.get_content()) for node in nodes]
+        term_counts = Counter()
+        for row in rows:
+            term_counts.update(set(TOKEN_PATTERN.findall(row[4].lower())))
+
+        with lock:
+            for row in rows:
+                rowid = connection.execute("INSERT INTO chunks (node_id, document_id, chunk_index, page_number, text) VALUES (?, ?, ?, ?, ?)", row).lastrowid
+                connection.execute("INSERT INTO chunk_nodes (rowid, node_id) VALUES (?, ?)", (rowid, row[0]))
+            connection.executemany("""INSERT INTO term_frequency (term, chunks) VALUES (?, ?)
+                ON CONFLICT (term) DO UPDATE SET chunks = chunks + excluded.chunks""", term_counts.items())
+            connection.execute("UPDATE chunk_count SET total = total + ? WHERE id = 1", (len(rows),))
+            connection.commit()
+
+    def _rowids(self, connection, node_ids: list):
+        rowids = []
+        # stays under SQLite's bound parameter limit
+        for start in range(0, len(node_ids), 500):
+            batch = node_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rowids.extend(row[0] for row in connection.execute(f"SELECT rowid FROM chunk_nodes WHERE node_id IN ({placeholders})", batch))
+        return rowids
+
+    def delete(self, collection_id: int, node_ids: list):
+        if not node_ids:
+            return
+        connection, lock = self._connection(collection_id)
+        with lock:
+            term_counts = Counter()
+            rowids = self._rowids(connection, node_ids)
+            for rowid in rowids:
+                text = connection.execute("SELECT text FROM chunks WHERE rowid = ?", (rowid,)).fetchone()[0]
+                term_counts.update(set(TOKEN_PATTERN.findall(text.lower())))
+                connection.execute("DELETE FROM chunks WHERE rowid = ?", (rowid,))
+                connection.execute("DELETE FROM chunk_nodes WHERE rowid = ?", (rowid,))
+
+            connection.executemany("UPDATE term_frequency SET chunks = chunks - ? WHERE term = ?",
+                                   [(count, term) for term, count in term_counts.items()])
+            connection.executemany("DELETE FROM term_frequency WHERE term = ? AND chunks <= 0", [(term,) for term in term_counts])
+            connection.execute("UPDATE chunk_count SET total = MAX(total - ?, 0) WHERE id = 1", (len(rowids),))
+            connection.commit()
+
+    def update_positions(self, collection_id: int, positions: dict):
+        if not positions:
+            return
+        connection, lock = self._connection(collection_id)
+        with lock:
+            for node_id, (chunk_index, page_number) in positions.items():
+                connection.execute("""UPDATE chunks SET chunk_index = ?, page_number = ?
+                    WHERE rowid = (SELECT rowid FROM chunk_nodes WHERE node_id = ?)""", (chunk_index, page_number, node_id))
+            connection.commit()
+
+    def _selective_terms(self, connection, terms: list):
+        # terms found in most chunks add almost nothing to BM25 but make FTS5 score every chunk that has them
+        placeholders = ",".join("?" * len(terms))
+        frequencies = dict(connection.execute(f"SELECT term, chunks FROM term_frequency WHERE term IN ({placeholders})", terms).fetchall())
+        frequencies = {term: frequency for term, frequency in frequencies.items() if frequency}
+        if not frequencies:
+            return []
+
+        total = connection.execute("SELECT total FROM chunk_count WHERE id = 1").fetchone()[0]
+        # small collections keep every term, scoring a few thousand postings is cheap
+        max_frequency = max(self.max_document_frequency * total, 1000)
+        selective = [term for term, frequency in frequencies.items() if frequency <= max_frequency]
+        return selective or [min(frequencies, key=frequencies.get)]
+
+    def search(self, collection_id: int, query: str, top_k: int):
+        terms = list(dict.fromkeys(TOKEN_PATTERN.findall(query.lower())))
+        if not terms:
+            return []
+
+        connection, lock = self._connection(collection_id)
+        with lock:
+            terms = self._selective_terms(connection, terms)
+            if not terms:
+                return []
+            match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+            rows = connection.execute("""SELECT node_id, document_id, chunk_index, page_number, text, bm25(chunks) AS score
+                FROM chunks WHERE chunks MATCH ? ORDER BY score LIMIT ?""", (match, top_k)).fetchall()
+
+        results = []
+        for node_id, document_id, chunk_index, page_number, text, score in rows:
+            metadata = {"document_id": document_id, "chunk_index": chunk_index, "collection_id": collection_id}
+            if page_number is not None:
+                metadata["page_number"] = page_number
+            # FTS5 reports BM25 as a negative number where lower is better
+            results.append(NodeWithScore(node=TextNode(id_=node_id, text=text, metadata=metadata), score=-score))
+        return results
+
+    def drop(self, collection_id: int):
+        with self.lock:
+            connection = self.connections.pop(collection_id, None)
+            self.locks.pop(collection_id, None)
+        if connection:
+            connection.close()
+        for suffix in ["", "-wal", "-shm"]:
+            path = os.path.join(self.path, f"collection_{collection_id}.sqlite3{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+
+class HybridRetriever(BaseRetriever):
+    def __init__(self, vector_retriever: BaseRetriever, lexical_indexes: LexicalIndexes, collection_id: int,
+                 candidates: int, top_k: int, rrf_k: int = 60):
+        super().__init__()
+        self.vector_retriever = vector_retriever
+        self.lexical_indexes = lexical_indexes
+        self.collection_id = collection_id
+        self.candidates = candidates
+        self.top_k = top_k
+        self.rrf_k = rrf_k
+
+    def candidates_for(self, query_bundle: QueryBundle):
+        with span("vector_search"):
+            vector_results = self.vector_retriever.retrieve(query_bundle)
+        with span("lexical_search"):
+            lexical_results = self.lexical_indexes.search(self.collection_id, query_bundle.query_str, self.candidates)
+        return vector_results, lexical_results
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return reciprocal_rank_fusion(self.candidates_for(query_bundle), self.top_k, self.rrf_k)
+
+def reciprocal_rank_fusion(result_lists: list, top_k: int, rrf_k: int = 60):
+    # the fused value only decides the order; the score returned is the one from the first list (the vector
+    # similarity), so callers keep a meaningful number, and hits only the other lists found get None
+    fused_scores = {}
+    nodes = {}
+    scores = {}
+    for position, results in enumerate(result_lists):
+        for rank, result in enumerate(results):
+            node_id = result.node.node_id
+            fused_scores[node_id] = fused_scores.get(node_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+            nodes.setdefault(node_id, result.node)
+            if position == 0:
+                scores.setdefault(node_id, result.score)
+
+    ranked = sorted(fused_scores, key=fused_scores.get, reverse=True)[:top_k]
+    return [NodeWithScore(node=nodes[node_id], score=scores.get(node_id)) for node_id in ranked]
@@ -0,0 +1,103 @@
+import asyncio, os, threading
+import numpy
+from typing import List, Optional
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+BGE_QUERY_INSTRUCTION = "Represent this sentence for searching relevant passages: "
+
+def default_query_instruction(model_name: str):
+    # same prompt HuggingFaceEmbedding uses for these models, so both backends embed queries alike
+    return BGE_QUERY_INSTRUCTION if model_name.startswith("BAAI/bge-") and "-zh" not in model_name else ""
+
+def export_quantized_model(model_name: str, model_dir: str):
+    # one-off conversion that needs torch and optimum; the running backend only needs onnxruntime and tokenizers
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+    model.save_pretrained(model_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(model_dir)
+    quantizer = ORTQuantizer.from_pretrained(model_dir)
+    quantizer.quantize(save_dir=model_dir, quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False))
+
+class OnnxEmbedding(BaseEmbedding):
+    model_dir: str = Field(description="Directory holding model_quantized.onnx and tokenizer.json.")
+    threads: int = Field(description="Intra-op threads used by ONNX Runtime.")
+    max_length: int = Field(default=512, description="Tokens kept per text.")
+    pooling: str = Field(default="cls", description="cls or mean pooling of the last hidden state.")
+    query_instruction: Optional[str] = Field(default=None, description="Prompt prepended to queries.")
+    _session = PrivateAttr(default=None)
+    _tokenizer = PrivateAttr(default=None)
+    _input_names: list = PrivateAttr(default_factory=list)
+    _tokenizer_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if self.query_instruction is None:
+            self.query_instruction = default_query_instruction(self.model_name)
+
+        model_path = os.path.join(self.model_dir, "model_quantized.onnx")
+        if not os.path.exists(model_path):
+            export_quantized_model(self.model_name, self.model_dir)
+
+        import onnxruntime
+        from tokenizers import Tokenizer
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = [model_input.name for model_input in self._session.get_inputs()]
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=self.max_length)
+        if self._tokenizer.padding is None:
+            self._tokenizer.enable_padding()
+
+    @classmethod
+    def class_name(cls):
+        return "OnnxEmbedding"
+
+    def _embed_batch(self, texts: List[str]):
+        # the Rust tokenizer raises "Already borrowed" when two threads use it at once
+        with self._tokenizer_lock:
+            encodings = self._tokenizer.encode_batch(texts)
+        attention_mask = numpy.array([encoding.attention_mask for encoding in encodings], dtype=numpy.int64)
+        inputs = {"input_ids": numpy.array([encoding.ids for encoding in encodings], dtype=numpy.int64),
+                  "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = numpy.array([encoding.type_ids for encoding in encodings], dtype=numpy.int64)
+
+        hidden_state = self._session.run(None, inputs)[0]
+        if self.pooling == "mean":
+            mask = attention_mask[..., None].astype(numpy.float32)
+            pooled = (hidden_state * mask).sum(axis=1) / numpy.clip(mask.sum(axis=1), 1e-9, None)
+        else:
+            pooled = hidden_state[:, 0]
+        return pooled / numpy.clip(numpy.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def _embed(self, texts: List[str], prompt_name: str = "text"):
+        if prompt_name == "query" and self.query_instruction:
+            texts = [f"{self.query_instruction}{text}" for text in texts]
+        # texts of similar length are batched together so little of each batch is padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = [None] * len(texts)
+        for start in range(0, len(order), self.embed_batch_size):
+            batch = order[start:start + self.embed_batch_size]
+            for i, embedding in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                embeddings[i] = embedding.tolist()
+        return embeddings
+
+    def _get_query_embedding(self, query: str):
+        return self._embed([query], prompt_name="query")[0]
+
+    async def _aget_query_embedding(self, query: str):
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def _get_text_embedding(self, text: str):
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]):
+        return self._embed(texts)
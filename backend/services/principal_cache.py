@@ -0,0 +1,89 @@
+import os, threading, time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import User
+
+load_dotenv()
+
+class PrincipalCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.invalidated_at = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def detached_copy(self, user: User):
+        copy = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+        make_transient_to_detached(copy)
+        return copy
+
+    def cached(self, user_id: int, now: float):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and entry[1] > now:
+                self.hits += 1
+                self.entries.move_to_end(user_id)
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def get_user(self, user_id: int, db: Session):
+        now = time.monotonic()
+        cached_user = self.cached(user_id, now)
+        if cached_user is not None:
+            # load=False attaches a copy to the request session without a SELECT, so routes can still modify and commit it
+            return db.merge(cached_user, load=False)
+
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            self.store(user, now)
+        return user
+
+    async def aget_user(self, user_id: int, db: AsyncSession):
+        # async routes only read the user, so a hit returns the detached copy and never touches the session
+        now = time.monotonic()
+        cached_user = self.cached(user_id, now)
+        if cached_user is not None:
+            return self.detached_copy(cached_user)
+
+        user = await db.scalar(select(User).where(User.id == user_id))
+        if user:
+            self.store(user, now)
+        return user
+
+    def store(self, user: User, loaded_at: float):
+        copy = self.detached_copy(user)
+        with self.lock:
+            # a profile update that committed while this user was being loaded wins over the older row
+            if self.invalidated_at.get(user.id, 0) >= loaded_at:
+                return
+            self.entries[user.id] = (copy, loaded_at + self.ttl)
+            self.entries.move_to_end(user.id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self.lock:
+            self.entries.pop(user_id, None)
+            self.invalidated_at[user_id] = time.monotonic()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+principal_cache = PrincipalCache(int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000")),
+                                 float(os.getenv("AUTH_CACHE_TTL", "60")))
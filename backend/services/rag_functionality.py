@@ -1,131 +1,608 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import cast, select, update, Integer, String
+from sqlalchemy.exc import IntegrityError
 from dotenv import load_dotenv
-from db.models import Document, IndexedCollection, AdminSettings
-import os, chromadb
+from db.models import Document, IndexedCollection, AdminSettings, CollectionChunking, CollectionVersion
+import os, threading, time, asyncio
+from contextlib import asynccontextmanager, AsyncExitStack
 from datetime import datetime
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.core import Document as LDocument, VectorStoreIndex
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.openai import OpenAI
-from llama_index.core.text_splitter import SentenceSplitter
+from llama_index.core import VectorStoreIndex, get_response_synthesizer
+from llama_index.core.schema import TextNode, QueryBundle, NodeRelationship, RelatedNodeInfo
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+from services.embedding_cache import EmbeddingCache, CachedEmbedding
+from services.response_cache import response_cache
+from services.lexical_index import LexicalIndexes, HybridRetriever, reciprocal_rank_fusion
+from services.index_registry import IndexRegistry
+from services.reranker import CrossEncoderRerank
+from services.tracing import span
+from services.chunking import iter_chunks, document_pages, default_strategies
+from llama_index.core.query_engine import RetrieverQueryEngine
 
 load_dotenv()
-embedding_model_name = os.getenv("EMBEDDING_MODEL_NAME")
-embed_model = HuggingFaceEmbedding(model_name=embedding_model_name)
+embedding_model_name = os.getenv("EMBEDDING_MODEL_NAME", "BAAI/bge-small-en-v1.5")
+embedding_backend = os.getenv("EMBEDDING_BACKEND", "torch")
+embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3"),
+                                 int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")))
+
+# torch, transformers and chromadb take seconds to import, so they are loaded on first use instead of at startup
+def load_embed_model(backend: str = embedding_backend):
+    if backend == "onnx":
+        from services.onnx_embedding import OnnxEmbedding
+        return OnnxEmbedding(model_name=embedding_model_name, embed_batch_size=embed_batch_size,
+                             model_dir=os.path.join(os.getenv("ONNX_MODEL_DIR", "./onnx_models"), embedding_model_name.replace("/", "__")),
+                             threads=int(os.getenv("ONNX_THREADS", "0")) or os.cpu_count(),
+                             pooling=os.getenv("EMBEDDING_POOLING", "cls"))
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    return HuggingFaceEmbedding(model_name=embedding_model_name, embed_batch_size=embed_batch_size)
+
+# int8 vectors are close to but not the same as the torch ones, so each backend gets its own cache entries
+embed_model = CachedEmbedding(load_embed_model, embedding_cache,
+                              f"{embedding_model_name}:onnx-int8" if embedding_backend == "onnx" else embedding_model_name,
+                              embed_batch_size)
 chroma_path = os.getenv("CHROMA_PATH")
+source_snippet_length = int(os.getenv("SOURCE_SNIPPET_LENGTH", "300"))
+retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid")
+retrieval_top_k = int(os.getenv("RETRIEVAL_TOP_K", "2"))
+retrieval_candidates = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+batch_query_concurrency = int(os.getenv("BATCH_QUERY_CONCURRENCY", "8"))
+reranker = None
+if os.getenv("RERANK_ENABLED", "false").lower() == "true":
+    reranker = CrossEncoderRerank(model=os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+                                  top_n=retrieval_top_k,
+                                  token_budget=int(os.getenv("RERANK_TOKEN_BUDGET", "1500")),
+                                  batch_size=int(os.getenv("RERANK_BATCH_SIZE", "16")))
+lexical_indexes = LexicalIndexes(os.getenv("LEXICAL_INDEX_PATH") or os.path.join(os.path.dirname(os.path.abspath(chroma_path)), "lexical_index"))
+
+settings_version_query = select(AdminSettings.setting_value).where(AdminSettings.setting_key == "settings_version")
+settings_query = select(AdminSettings.setting_key, AdminSettings.setting_value)
+
+class SettingsCache:
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.settings = None
+        self.version = None
+        self.checked_at = 0.0
+        self.llm_clients = {}
+        self.lock = threading.Lock()
+
+    def fresh(self):
+        with self.lock:
+            if self.settings is not None and time.monotonic() - self.checked_at < self.refresh_interval:
+                return self.settings
+
+    def update(self, version, rows, checked_at: float):
+        # the lock only guards the swap, the SELECTs run outside it: async callers query on the event loop thread
+        # and must never wait on a lock another coroutine holds across an await
+        with self.lock:
+            if rows is not None:
+                self.settings = {row.setting_key: row.setting_value for row in rows}
+                self.version = version
+            elif self.settings is None or version != self.version:
+                return None
+            self.checked_at = checked_at
+            return self.settings
+
+    def get(self, setting_key: str, db: Session):
+        settings = self.fresh()
+        if settings is None:
+            checked_at = time.monotonic()
+            # other workers bump settings_version when they write, so one cheap SELECT tells us if our copy is stale
+            version = db.scalar(settings_version_query)
+            settings = self.update(version, None, checked_at) or self.update(version, db.execute(settings_query).all(), checked_at)
+        return settings.get(setting_key)
+
+    async def aget(self, setting_key: str, db: AsyncSession):
+        settings = self.fresh()
+        if settings is None:
+            checked_at = time.monotonic()
+            version = await db.scalar(settings_version_query)
+            settings = self.update(version, None, checked_at) or self.update(version, (await db.execute(settings_query)).all(), checked_at)
+        return settings.get(setting_key)
+
+    def get_llm(self, model_name: str):
+        with self.lock:
+            if model_name not in self.llm_clients:
+                from llama_index.llms.openai import OpenAI
+                self.llm_clients[model_name] = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), model=model_name)
+            return self.llm_clients[model_name]
+
+    def invalidate(self):
+        with self.lock:
+            self.settings = None
+
+settings_cache = SettingsCache(float(os.getenv("SETTINGS_REFRESH_INTERVAL", "5")))
+
+def bump_settings_version(db: Session):
+    updated = db.query(AdminSettings).filter(AdminSettings.setting_key == "settings_version").update(
+        {AdminSettings.setting_value: cast(cast(AdminSettings.setting_value, Integer) + 1, String)}, synchronize_session=False)
+    if not updated:
+        db.add(AdminSettings(setting_key="settings_version", setting_value="1"))
+
+def collection_version_query(collection_id: int):
+    return select(CollectionVersion.version).where(CollectionVersion.collection_id == collection_id)
+
+def bump_collection_version(collection_id: int, db: Session):
+    updated = db.execute(update(CollectionVersion).where(CollectionVersion.collection_id == collection_id)
+                         .values(version=CollectionVersion.version + 1)).rowcount
+    if not updated:
+        db.add(CollectionVersion(collection_id=collection_id, version=1))
+    try:
+        db.commit()
+    except IntegrityError:
+        # another worker inserted the first version row at the same time
+        db.rollback()
+        bump_collection_version(collection_id, db)
+
+def invalidate_responses(collection_id: int, db: Session):
+    # cached answers carry the collection version, so bumping it also expires them in every other worker
+    bump_collection_version(collection_id, db)
+    response_cache.invalidate(collection_id)
+
+async def abump_collection_version(collection_id: int, db: AsyncSession):
+    # committed by the caller together with its own changes
+    updated = (await db.execute(update(CollectionVersion).where(CollectionVersion.collection_id == collection_id)
+                                .values(version=CollectionVersion.version + 1))).rowcount
+    if not updated:
+        db.add(CollectionVersion(collection_id=collection_id, version=1))
 
 def get_current_model(db: Session):
-    model_setting = db.query(AdminSettings).filter(AdminSettings.setting_key == "openai_model").first()
-    return model_setting.setting_value
+    return settings_cache.get("openai_model", db)
 
 def get_llm_instance(db: Session):
     current_model = get_current_model(db)
-    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), model=current_model)
+    return settings_cache.get_llm(current_model)
 
 def get_custom_context(db: Session):
-    context_setting = db.query(AdminSettings).filter(AdminSettings.setting_key == "custom_context").first()
-    if context_setting:
-        return context_setting.setting_value
-    return None
+    return settings_cache.get("custom_context", db)
 
-def set_custom_context(custom_context: str, db: Session):
-    context_setting = db.query(AdminSettings).filter(AdminSettings.setting_key == "custom_context").first()
-    if context_setting:
-        context_setting.setting_value = custom_context
-        context_setting.updated_at = datetime.utcnow()
+async def aget_current_model(db: AsyncSession):
+    return await settings_cache.aget("openai_model", db)
+
+async def aget_llm_instance(db: AsyncSession):
+    return settings_cache.get_llm(await aget_current_model(db))
+
+async def aget_custom_context(db: AsyncSession):
+    return await settings_cache.aget("custom_context", db)
+
+def save_setting(setting_key: str, setting_value: str, db: Session):
+    setting = db.query(AdminSettings).filter(AdminSettings.setting_key == setting_key).first()
+    if setting:
+        setting.setting_value = setting_value
+        setting.updated_at = datetime.utcnow()
     else:
-        context_setting = AdminSettings(setting_key="custom_context", setting_value=custom_context)
-        db.add(context_setting)
+        setting = AdminSettings(setting_key=setting_key, setting_value=setting_value)
+        db.add(setting)
+    bump_settings_version(db)
     db.commit()
-    return context_setting
-    
-chroma_client = chromadb.PersistentClient(path=chroma_path)
-all_collection_id = {}
+    settings_cache.invalidate()
+    return setting
 
-def index_document(document: Document, db: Session):
-    collection_id = document.collection_id
-    
-    text_splitter = SentenceSplitter(chunk_size=512, chunk_overlap=70)
-    text_chunks = text_splitter.split_text(document.content)
-    
-    llama_documents = []
-    for i, chunk in enumerate(text_chunks):
-        metadata = {"document_id": document.id, "chunk_index": i, "collection_id": collection_id}
-        llama_documents.append(LDocument(text=chunk, metadata=metadata))
+def set_current_model(model_name: str, db: Session):
+    return save_setting("openai_model", model_name, db)
+
+def set_custom_context(custom_context: str, db: Session):
+    return save_setting("custom_context", custom_context, db)
     
-    if collection_id not in all_collection_id:
-        indexed_collection = db.query(IndexedCollection).filter(IndexedCollection.collection_id == collection_id).first()
-        
-        if indexed_collection:
-            chroma_collection = chroma_client.get_collection(name=indexed_collection.chroma_collection_name)
-        else:
-            chroma_collection_name = f"collection_{collection_id}"
-            chroma_collection = chroma_client.get_or_create_collection(name=chroma_collection_name)
-            indexed_collection = IndexedCollection(collection_id=collection_id, chroma_collection_name=chroma_collection_name)
-            db.add(indexed_collection)
-            db.commit()
-            
+chroma_client = None
+chroma_client_lock = threading.Lock()
+
+def get_chroma_client():
+    global chroma_client
+    with chroma_client_lock:
+        if chroma_client is None:
+            import chromadb
+            chroma_client = chromadb.PersistentClient(path=chroma_path)
+        return chroma_client
+
+def open_index(chroma_collection_name: str):
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+    with span("index_load"):
+        chroma_collection = get_chroma_client().get_collection(name=chroma_collection_name)
         vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-        all_collection_id[collection_id] = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
+        return VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
 
-    for llama_document in llama_documents:
-        all_collection_id[collection_id].insert(llama_document)
+index_registry = IndexRegistry(open_index, int(os.getenv("MAX_LOADED_INDEXES", "32")))
 
-def load_indexed_collections(db: Session):
-    indexed_collections = db.query(IndexedCollection).all()
-    
-    for indexed_collection in indexed_collections:
-        collection_id = indexed_collection.collection_id
-        if collection_id not in all_collection_id:
-            chroma_collection = chroma_client.get_collection(name=indexed_collection.chroma_collection_name)
-            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-            all_collection_id[collection_id] = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
-
-def query_collection_index(query: str, collection_id: int, db: Session, context: list = None):
-    if collection_id not in all_collection_id:
-        return {"response": "No documents found in this collection", "sources": []}
-    
-    llm = get_llm_instance(db)
-    query_engine = all_collection_id[collection_id].as_query_engine(llm=llm)
-    
-    custom_context = get_custom_context(db)
-    
+def warm_up():
+    embed_model.load()
+    get_chroma_client()
+    if reranker:
+        reranker.load()
+
+def indexed_collection_name(collection_id: int, db: Session):
+    return db.scalar(select(IndexedCollection.chroma_collection_name).where(IndexedCollection.collection_id == collection_id))
+
+def create_indexed_collection(collection_id: int, db: Session):
+    chroma_collection_name = f"collection_{collection_id}"
+    get_chroma_client().get_or_create_collection(name=chroma_collection_name)
+    db.add(IndexedCollection(collection_id=collection_id, chroma_collection_name=chroma_collection_name))
+    try:
+        db.commit()
+    except IntegrityError:
+        # another worker process registered the collection first
+        db.rollback()
+        return indexed_collection_name(collection_id, db)
+    return chroma_collection_name
+
+def use_collection_index(collection_id: int, db: Session, create: bool = False):
+    def resolve():
+        chroma_collection_name = indexed_collection_name(collection_id, db)
+        if chroma_collection_name is None and create:
+            chroma_collection_name = create_indexed_collection(collection_id, db)
+        return chroma_collection_name
+
+    return index_registry.use(collection_id, resolve)
+
+@asynccontextmanager
+async def ause_collection_index(collection_id: int, db: AsyncSession):
+    index = index_registry.checkout(collection_id)
+    if index is None:
+        chroma_collection_name = await db.scalar(select(IndexedCollection.chroma_collection_name).where(IndexedCollection.collection_id == collection_id))
+        if chroma_collection_name:
+            index = await asyncio.to_thread(index_registry.checkout, collection_id, lambda: chroma_collection_name)
+    try:
+        yield index
+    finally:
+        if index is not None:
+            index_registry.release(collection_id)
+
+def build_nodes(text_chunks: list, metadatas: list):
+    with span("embed", chunks=len(text_chunks)):
+        embeddings = embed_model.get_text_embedding_batch(text_chunks)
+    # the source relationship is what the vector store writes to its filterable document_id field
+    return [TextNode(text=chunk, metadata=metadata, embedding=embedding,
+                     relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=str(metadata["document_id"]))})
+            for chunk, metadata, embedding in zip(text_chunks, metadatas, embeddings)]
+
+def add_nodes(index: VectorStoreIndex, collection_id: int, nodes: list):
+    with span("vector_write"):
+        index.vector_store.add(nodes)
+    with span("lexical_write"):
+        lexical_indexes.add(collection_id, nodes)
+
+def build_retriever(index: VectorStoreIndex, collection_id: int, top_k: int):
+    if retrieval_mode != "hybrid":
+        return index.as_retriever(similarity_top_k=top_k)
+
+    vector_retriever = index.as_retriever(similarity_top_k=retrieval_candidates)
+    return HybridRetriever(vector_retriever, lexical_indexes, collection_id, retrieval_candidates, top_k)
+
+def retrieve_candidates(index: VectorStoreIndex, collection_id: int, top_k: int, query_bundle: QueryBundle):
+    retriever = build_retriever(index, collection_id, top_k)
+    if isinstance(retriever, HybridRetriever):
+        return retriever.candidates_for(query_bundle)
+    return retriever.retrieve(query_bundle), []
+
+def build_query_engine(index: VectorStoreIndex, collection_id: int, llm, streaming: bool = False):
+    # with a reranker the retrievers over-fetch candidates and the reranker cuts them down to retrieval_top_k
+    top_k = retrieval_candidates if reranker else retrieval_top_k
+    node_postprocessors = [reranker] if reranker else []
+    return RetrieverQueryEngine.from_args(build_retriever(index, collection_id, top_k), llm=llm, streaming=streaming,
+                                          node_postprocessors=node_postprocessors)
+
+def chunking_strategy(collection_id: int, file_type: str, db: Session):
+    strategy = db.scalar(select(CollectionChunking.strategy).where(CollectionChunking.collection_id == collection_id,
+                                                                   CollectionChunking.file_type == file_type))
+    return strategy or default_strategies.get(file_type, "sentence")
+
+def chunk_metadata(document: Document, chunk_index: int, page_number, chunk: str):
+    metadata = {"document_id": document.id, "chunk_index": chunk_index, "collection_id": document.collection_id,
+                "chunk_hash": embedding_cache.hash_text(chunk)}
+    if page_number is not None:
+        metadata["page_number"] = page_number
+    return metadata
+
+def chunk_document(document: Document, content: str, db: Session):
+    with span("chunk"):
+        return list(iter_chunks(chunking_strategy(document.collection_id, document.file_type, db),
+                                document_pages(document.file_type, content)))
+
+def index_document(document: Document, content: str, db: Session):
+    collection_id = document.collection_id
+
+    chunks = chunk_document(document, content, db)
+    if not chunks:
+        return 0
+
+    text_chunks = [chunk for _, chunk in chunks]
+    metadatas = [chunk_metadata(document, i, page_number, chunk) for i, (page_number, chunk) in enumerate(chunks)]
+    nodes = build_nodes(text_chunks, metadatas)
+    with use_collection_index(collection_id, db, create=True) as index:
+        if index is None:
+            raise ValueError("Collection is being removed")
+        add_nodes(index, collection_id, nodes)
+    invalidate_responses(collection_id, db)
+
+    return len(nodes)
+
+def index_pages(document: Document, pages, db: Session, replace: bool = False):
+    collection_id = document.collection_id
+    strategy = chunking_strategy(collection_id, document.file_type, db)
+
+    chunk_count = 0
+    pending_chunks = []
+    pending_metadatas = []
+    with use_collection_index(collection_id, db, create=True) as index:
+        if index is None:
+            raise ValueError("Collection is being removed")
+        # pages are never held in memory together, so a streamed replace re-adds every chunk (unchanged ones hit the embedding cache)
+        if replace:
+            remove_document_chunks(index, collection_id, document.id)
+        for page_number, chunk in iter_chunks(strategy, pages):
+            pending_chunks.append(chunk)
+            pending_metadatas.append(chunk_metadata(document, chunk_count, page_number, chunk))
+            chunk_count += 1
+
+            if len(pending_chunks) >= embed_batch_size:
+                add_nodes(index, collection_id, build_nodes(pending_chunks, pending_metadatas))
+                pending_chunks, pending_metadatas = [], []
+
+        if pending_chunks:
+            add_nodes(index, collection_id, build_nodes(pending_chunks, pending_metadatas))
+    invalidate_responses(collection_id, db)
+
+    return chunk_count
+
+def document_chunks(index: VectorStoreIndex, document_id: int):
+    result = index.vector_store.client.get(where={"document_id": str(document_id)}, include=["metadatas"])
+    return dict(zip(result["ids"], result["metadatas"]))
+
+def remove_document_chunks(index: VectorStoreIndex, collection_id: int, document_id: int):
+    node_ids = list(document_chunks(index, document_id))
+    if node_ids:
+        index.vector_store.client.delete(ids=node_ids)
+        lexical_indexes.delete(collection_id, node_ids)
+    return len(node_ids)
+
+def reindex_document(document: Document, content: str, db: Session):
+    collection_id = document.collection_id
+
+    chunks = chunk_document(document, content, db)
+
+    with use_collection_index(collection_id, db, create=True) as index:
+        if index is None:
+            raise ValueError("Collection is being removed")
+
+        # chunks whose text is unchanged keep their vectors, only their position metadata is rewritten
+        existing_chunks = document_chunks(index, document.id)
+        existing_ids_by_hash = {}
+        for node_id, metadata in existing_chunks.items():
+            existing_ids_by_hash.setdefault(metadata.get("chunk_hash"), []).append(node_id)
+
+        kept = {}
+        new_chunks, new_metadatas = [], []
+        for i, (page_number, chunk) in enumerate(chunks):
+            metadata = chunk_metadata(document, i, page_number, chunk)
+            existing_ids = existing_ids_by_hash.get(metadata["chunk_hash"])
+            if existing_ids:
+                kept[existing_ids.pop()] = metadata
+            else:
+                new_chunks.append(chunk)
+                new_metadatas.append(metadata)
+
+        stale_ids = [node_id for node_ids in existing_ids_by_hash.values() for node_id in node_ids]
+        if stale_ids:
+            index.vector_store.client.delete(ids=stale_ids)
+            lexical_indexes.delete(collection_id, stale_ids)
+        moved = {node_id: metadata for node_id, metadata in kept.items()
+                 if any(existing_chunks[node_id].get(key) != metadata.get(key) for key in ("chunk_index", "page_number"))}
+        if moved:
+            moved_metadatas = []
+            for node_id, metadata in moved.items():
+                node = metadata_dict_to_node(existing_chunks[node_id])
+                node.metadata.update(metadata)
+                moved_metadatas.append(node_to_metadata_dict(node, remove_text=True, flat_metadata=True))
+            index.vector_store.client.update(ids=list(moved), metadatas=moved_metadatas)
+            lexical_indexes.update_positions(collection_id, {node_id: (metadata["chunk_index"], metadata.get("page_number"))
+                                                            for node_id, metadata in moved.items()})
+        for start in range(0, len(new_chunks), embed_batch_size):
+            add_nodes(index, collection_id, build_nodes(new_chunks[start:start + embed_batch_size], new_metadatas[start:start + embed_batch_size]))
+    invalidate_responses(collection_id, db)
+
+    return len(chunks), len(new_chunks)
+
+def build_enhanced_query(query: str, db: Session, context: list = None):
+    return enhance_query(query, get_custom_context(db), context)
+
+async def abuild_enhanced_query(query: str, db: AsyncSession, context: list = None):
+    return enhance_query(query, await aget_custom_context(db), context)
+
+def enhance_query(query: str, custom_context: str, context: list = None):
     if context:
         context_str = "\n".join(context)
-        enhanced_query = f"Previous conversation context:\n{context_str}\nCurrent question: {query}"
+        return f"Previous conversation context:\n{context_str}\nCurrent question: {query}"
     elif custom_context:
-        enhanced_query = f"Additional context: {custom_context}\nQuestion: {query}"
-    else:
-        enhanced_query = query
-    
-    response = query_engine.query(enhanced_query)
+        return f"Additional context: {custom_context}\nQuestion: {query}"
+    return query
+
+def resolve_sources(source_nodes: list, db: Session):
+    document_ids = {source_node.node.metadata.get('document_id') for source_node in source_nodes}
+    document_ids.discard(None)
+
+    document_names = {}
+    if document_ids:
+        rows = db.query(Document.id, Document.file_name).filter(Document.id.in_(document_ids)).all()
+        document_names = {row.id: row.file_name for row in rows}
+
     sources = []
-    if response.source_nodes:
-        for source_node in response.source_nodes:
-
-            metadata = source_node.node.metadata
-            document_id = metadata.get('document_id')
-            chunk_index = metadata.get('chunk_index')
-
-            print(document_id)
-            print(chunk_index)
-
-            if document_id is None: 
-                continue
-                
-            document = db.query(Document).filter(Document.id == document_id).first()
-            if document:
-                document_name = document.file_name
-            else:
-                document_name = "Unknown document"
-            
-            sources.append({
-                "document_name": document_name,
-                "chunk_id": chunk_index,
-                "document_id": document_id
-            })
-    
-    return {
-        "response": str(response),
-        "sources": sources
-    }
\ No newline at end of file
+    for source_node in source_nodes:
+        metadata = source_node.node.metadata
+        document_id = metadata.get('document_id')
+        if document_id is None: 
+            continue
+
+        sources.append({
+            "document_name": document_names.get(document_id, "Unknown document"),
+            "chunk_id": metadata.get('chunk_index'),
+            "document_id": document_id,
+            "collection_id": metadata.get('collection_id'),
+            "text": source_node.node.get_content()[:source_snippet_length],
+            "score": source_node.score
+        })
+    return sources
+
+def retrieval_bundle(query: str, enhanced_query: str, embedding: list = None):
+    # BM25 and the reranker read query_str and only get the user's question, chat history or a custom context would
+    # otherwise turn the lexical search into an OR over every word of them; the vector side still embeds the enhanced text
+    return QueryBundle(query_str=query, custom_embedding_strs=[enhanced_query], embedding=embedding)
+
+def response_cache_key(query: str, collection_id: int, db: Session):
+    with span("embed_query"):
+        query_embedding = embed_model.get_query_embedding(query)
+    return (collection_id, db.scalar(collection_version_query(collection_id)) or 0, get_current_model(db), get_custom_context(db),
+            query_embedding)
+
+async def aresponse_cache_key(query: str, collection_id: int, db: AsyncSession):
+    version = await db.scalar(collection_version_query(collection_id)) or 0
+    model_name, custom_context = await aget_current_model(db), await aget_custom_context(db)
+    with span("embed_query"):
+        query_embedding = await embed_model.aget_query_embedding(query)
+    return (collection_id, version, model_name, custom_context, query_embedding)
+
+async def aquery_collection_index(query: str, collection_id: int, db: AsyncSession, context: list = None):
+    async with ause_collection_index(collection_id, db) as index:
+        if index is None:
+            return {"response": "No documents found in this collection", "sources": []}
+
+        cache_key = None
+        if not context:
+            cache_key = await aresponse_cache_key(query, collection_id, db)
+            with span("cache_lookup"):
+                cached_response = response_cache.lookup(*cache_key)
+            if cached_response:
+                return cached_response
+
+        with span("settings"):
+            llm, enhanced_query = await aget_llm_instance(db), await abuild_enhanced_query(query, db, context)
+        query_engine = build_query_engine(index, collection_id, llm)
+
+        # Chroma only has a blocking client, so retrieval runs in a thread and just the LLM call is awaited
+        with span("retrieve"):
+            source_nodes = await asyncio.to_thread(query_engine.retrieve, retrieval_bundle(query, enhanced_query))
+        with span("llm"):
+            response = await query_engine.asynthesize(QueryBundle(enhanced_query), source_nodes)
+
+        with span("resolve_sources"):
+            sources = await db.run_sync(lambda session: resolve_sources(response.source_nodes, session))
+        result = {
+            "response": str(response),
+            "sources": sources
+        }
+        if cache_key:
+            response_cache.store(*cache_key, result)
+        return result
+
+async def aquery_collections(query: str, collection_ids: list, db: AsyncSession):
+    async with AsyncExitStack() as stack:
+        indexes = {}
+        for collection_id in collection_ids:
+            index = await stack.enter_async_context(ause_collection_index(collection_id, db))
+            if index is not None:
+                indexes[collection_id] = index
+        if not indexes:
+            return {"response": "No documents found in these collections", "sources": []}
+
+        with span("settings"):
+            llm, enhanced_query = await aget_llm_instance(db), await abuild_enhanced_query(query, db)
+        # embedded once here instead of once per collection retriever
+        with span("embed_query"):
+            query_bundle = retrieval_bundle(query, enhanced_query, await embed_model.aget_query_embedding(enhanced_query))
+
+        top_k = retrieval_candidates if reranker else retrieval_top_k
+        with span("retrieve", collections=len(indexes)):
+            results = await asyncio.gather(*(asyncio.to_thread(retrieve_candidates, index, collection_id, top_k, query_bundle)
+                                             for collection_id, index in indexes.items()))
+        # RRF scores only encode the rank within one collection, so the raw vector and lexical hits of all collections
+        # are ranked globally first and fused once; vector similarities compare across collections (same model)
+        vector_results = sorted((node for vector_nodes, _ in results for node in vector_nodes), key=lambda node: node.score or 0.0, reverse=True)
+        lexical_results = sorted((node for _, lexical_nodes in results for node in lexical_nodes), key=lambda node: node.score or 0.0, reverse=True)
+        source_nodes = reciprocal_rank_fusion([vector_results, lexical_results], top_k)
+        if reranker:
+            source_nodes = await asyncio.to_thread(reranker.postprocess_nodes, source_nodes, query_bundle)
+
+        with span("llm"):
+            response = await get_response_synthesizer(llm=llm).asynthesize(QueryBundle(enhanced_query), source_nodes)
+
+        with span("resolve_sources"):
+            sources = await db.run_sync(lambda session: resolve_sources(response.source_nodes, session))
+        return {
+            "response": str(response),
+            "sources": sources
+        }
+
+async def aquery_collection_batch(queries: list, collection_id: int, db: AsyncSession):
+    # duplicate questions are answered once and reported at every position they appear in
+    positions = {}
+    for position, query in enumerate(queries):
+        positions.setdefault(query, []).append(position)
+
+    async with ause_collection_index(collection_id, db) as index:
+        if index is None:
+            for position, query in enumerate(queries):
+                yield {"index": position, "query": query, "response": "No documents found in this collection", "sources": []}
+            return
+
+        version = await db.scalar(collection_version_query(collection_id)) or 0
+        model_name, custom_context = await aget_current_model(db), await aget_custom_context(db)
+        llm = settings_cache.get_llm(model_name)
+        enhanced_queries = {query: enhance_query(query, custom_context) for query in positions}
+        # the cache is keyed by the plain question and retrieval uses the enhanced one, they only differ with a custom context
+        texts = list(dict.fromkeys([*positions, *enhanced_queries.values()]))
+        with span("embed_query", queries=len(texts)):
+            embeddings = dict(zip(texts, await asyncio.to_thread(embed_model.get_query_embedding_batch, texts)))
+
+        query_engine = build_query_engine(index, collection_id, llm)
+        semaphore = asyncio.Semaphore(batch_query_concurrency)
+        # an AsyncSession cannot be shared by concurrent tasks, so source lookups take turns
+        db_lock = asyncio.Lock()
+
+        async def answer(query: str):
+            try:
+                cache_key = (collection_id, version, model_name, custom_context, embeddings[query])
+                cached_response = response_cache.lookup(*cache_key)
+                if cached_response:
+                    return query, cached_response
+
+                async with semaphore:
+                    enhanced_query = enhanced_queries[query]
+                    with span("retrieve"):
+                        source_nodes = await asyncio.to_thread(query_engine.retrieve,
+                                                               retrieval_bundle(query, enhanced_query, embeddings[enhanced_query]))
+                    with span("llm"):
+                        response = await query_engine.asynthesize(QueryBundle(enhanced_query), source_nodes)
+                async with db_lock:
+                    sources = await db.run_sync(lambda session: resolve_sources(response.source_nodes, session))
+                result = {"response": str(response), "sources": sources}
+                response_cache.store(*cache_key, result)
+                return query, result
+            except Exception as e:
+                return query, {"error": str(e)}
+
+        tasks = [asyncio.create_task(answer(query)) for query in positions]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                query, result = await completed
+                for position in positions[query]:
+                    yield {"index": position, "query": query, **result}
+        finally:
+            # a client that disconnects mid-stream should not keep LLM calls running
+            for task in tasks:
+                task.cancel()
+
+def stream_collection_index(query: str, collection_id: int, db: Session, context: list = None):
+    # the index is only needed for retrieval, which query() finishes before returning the token generator
+    with use_collection_index(collection_id, db) as index:
+        if index is None:
+            return None
+
+        with span("settings"):
+            llm = get_llm_instance(db)
+            enhanced_query = build_enhanced_query(query, db, context)
+        query_engine = build_query_engine(index, collection_id, llm, streaming=True)
+
+        with span("retrieve"):
+            source_nodes = query_engine.retrieve(retrieval_bundle(query, enhanced_query))
+        # tokens are generated while the response streams, stream_answer reports time to first token
+        return query_engine.synthesize(QueryBundle(enhanced_query), source_nodes)
@@ -0,0 +1,76 @@
+import statistics, threading, time
+from collections import deque
+from typing import List, Optional
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+from services.tracing import span
+
+class CrossEncoderRerank(BaseNodePostprocessor):
+    model: str = Field(description="Sentence-transformers cross-encoder model name.")
+    top_n: int = Field(description="Number of nodes kept after reranking.")
+    token_budget: int = Field(description="Maximum tokens of kept node text.")
+    batch_size: int = Field(description="Query/node pairs scored per forward pass.")
+    _model = PrivateAttr(default=None)
+    _load_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _stats_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _latencies: deque = PrivateAttr(default_factory=lambda: deque(maxlen=1000))
+    _calls: int = PrivateAttr(default=0)
+    _candidates: int = PrivateAttr(default=0)
+    _kept: int = PrivateAttr(default=0)
+
+    @classmethod
+    def class_name(cls):
+        return "CrossEncoderRerank"
+
+    def load(self):
+        # like the embedding model, the cross-encoder is only loaded when the first query needs it
+        with self._load_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model, device="cpu")
+            return self._model
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None):
+        if not nodes or query_bundle is None:
+            return nodes[:self.top_n]
+
+        start = time.perf_counter()
+        texts = [node.node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        with span("rerank", candidates=len(nodes)):
+            scores = self.load().predict([(query_bundle.query_str, text) for text in texts],
+                                         batch_size=self.batch_size, show_progress_bar=False)
+
+        kept = []
+        used_tokens = 0
+        tokenizer = get_tokenizer()
+        for score, node, text in sorted(zip(scores, nodes, texts), key=lambda item: item[0], reverse=True):
+            if len(kept) == self.top_n:
+                break
+            tokens = len(tokenizer(text))
+            # a chunk that would overflow the budget is skipped, a shorter lower-ranked one may still fit
+            if kept and used_tokens + tokens > self.token_budget:
+                continue
+            used_tokens += tokens
+            kept.append(NodeWithScore(node=node.node, score=float(score)))
+
+        with self._stats_lock:
+            self._latencies.append(time.perf_counter() - start)
+            self._calls += 1
+            self._candidates += len(nodes)
+            self._kept += len(kept)
+        return kept
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            return {
+                "model": self.model,
+                "loaded": self._model is not None,
+                "calls": self._calls,
+                "average_candidates": round(self._candidates / self._calls, 1) if self._calls else 0.0,
+                "average_kept": round(self._kept / self._calls, 1) if self._calls else 0.0,
+                "median_ms": round(statistics.median(latencies) * 1000, 1) if latencies else 0.0,
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else 0.0
+            }
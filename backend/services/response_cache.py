@@ -0,0 +1,83 @@
+import os, threading, time
+import numpy
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class CachedResponse:
+    def __init__(self, collection_id, version, model_name, custom_context, query_embedding, response):
+        self.collection_id = collection_id
+        self.version = version
+        self.model_name = model_name
+        self.custom_context = custom_context
+        self.query_embedding = numpy.asarray(query_embedding, dtype=numpy.float32)
+        self.query_embedding /= numpy.linalg.norm(self.query_embedding) or 1.0
+        self.response = response
+        self.created_at = time.time()
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: int, similarity_threshold: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.entries = OrderedDict()
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, collection_id: int, version: int, model_name: str, custom_context, query_embedding):
+        query_vector = numpy.asarray(query_embedding, dtype=numpy.float32)
+        query_vector /= numpy.linalg.norm(query_vector) or 1.0
+        now = time.time()
+
+        with self.lock:
+            best_id, best_similarity = None, self.similarity_threshold
+            for entry_id, entry in list(self.entries.items()):
+                # an older version means another worker changed the collection's documents since the answer was cached
+                if now - entry.created_at > self.ttl or (entry.collection_id == collection_id and entry.version < version):
+                    del self.entries[entry_id]
+                    continue
+                if entry.collection_id != collection_id or entry.version != version or entry.model_name != model_name \
+                        or entry.custom_context != custom_context:
+                    continue
+                similarity = float(numpy.dot(entry.query_embedding, query_vector))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(best_id)
+            return self.entries[best_id].response
+
+    def store(self, collection_id: int, version: int, model_name: str, custom_context, query_embedding, response: dict):
+        entry = CachedResponse(collection_id, version, model_name, custom_context, query_embedding, response)
+        with self.lock:
+            self.entries[self.next_id] = entry
+            self.next_id += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, collection_id: int):
+        with self.lock:
+            for entry_id in [entry_id for entry_id, entry in self.entries.items() if entry.collection_id == collection_id]:
+                del self.entries[entry_id]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+response_cache = ResponseCache(int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+                               int(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+                               float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95")))
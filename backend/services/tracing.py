@@ -0,0 +1,80 @@
+import os, time, uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from prometheus_client import Histogram, Counter
+
+load_dotenv()
+
+# OpenTelemetry is optional: without it stages are still timed and exported to Prometheus
+try:
+    from opentelemetry import trace
+    tracer = trace.get_tracer("ragility")
+except ImportError:
+    tracer = None
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent in each stage of the RAG pipeline", ["stage"],
+                          buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+REQUEST_SECONDS = Histogram("http_request_seconds", "HTTP request latency until the response headers are sent",
+                            ["method", "route", "status"])
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Stages that raised an exception", ["stage"])
+
+request_id_var = ContextVar("request_id", default=None)
+request_stages_var = ContextVar("request_stages", default=None)
+
+def new_request_id(incoming: str = None):
+    return incoming or uuid.uuid4().hex
+
+@contextmanager
+def start_request(request_id: str, name: str):
+    request_id_token = request_id_var.set(request_id)
+    # a mutable dict is shared with the worker threads the request hands off to, so their stages land here too
+    stages_token = request_stages_var.set({})
+    try:
+        if tracer:
+            with tracer.start_as_current_span(name, attributes={"request.id": request_id}):
+                yield request_stages_var.get()
+        else:
+            yield request_stages_var.get()
+    finally:
+        request_id_var.reset(request_id_token)
+        request_stages_var.reset(stages_token)
+
+@contextmanager
+def span(stage: str, **attributes):
+    start = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(stage, attributes=attributes) if tracer else nullcontext():
+            yield
+    except Exception:
+        STAGE_ERRORS.labels(stage=stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+        stages = request_stages_var.get()
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + elapsed
+
+def server_timing(stages: dict):
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in stages.items())
+
+def setup_tracing(service_name: str):
+    exporter_name = os.getenv("TRACING_EXPORTER", "none").lower()
+    if exporter_name == "none":
+        return
+    if tracer is None:
+        raise ImportError("TRACING_EXPORTER is set but opentelemetry-sdk is not installed")
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    if exporter_name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    else:
+        exporter = ConsoleSpanExporter()
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
@@ -0,0 +1,8 @@
+import os, tempfile
+
+# rag_functionality opens Chroma, the lexical index and the embedding cache under these paths, so tests never touch real data
+data_dir = tempfile.mkdtemp(prefix="rag-tests-")
+os.environ["CHROMA_PATH"] = os.path.join(data_dir, "chroma")
+os.environ["LEXICAL_INDEX_PATH"] = os.path.join(data_dir, "lexical_index")
+os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(data_dir, "embedding_cache.sqlite3")
+os.environ["RERANK_ENABLED"] = "false"
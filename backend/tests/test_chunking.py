@@ -0,0 +1,35 @@
+from services.chunking import ChunkDeduplicator, CsvRowChunker, iter_chunks
+
+SAFETY_NOTICE = ("SAFETY NOTICE\nDisconnect the power supply and wait for all moving parts to stop before any maintenance. "
+                 "Wear protective gloves and eye protection. Report every incident to the site supervisor.")
+
+def test_repeated_boilerplate_is_a_duplicate():
+    deduplicator = ChunkDeduplicator(3, 0.9)
+
+    assert not deduplicator.seen(SAFETY_NOTICE)
+    assert deduplicator.seen(SAFETY_NOTICE)
+    assert deduplicator.seen(SAFETY_NOTICE.replace("site supervisor.", "site supervisor"))
+
+def test_chunks_that_differ_in_one_figure_are_kept():
+    deduplicator = ChunkDeduplicator(3, 0.9)
+    template = ("The hydraulic pump of the press must be inspected every {} hours. Use only parts approved for the press "
+                "and record every inspection in the maintenance book kept at the machine.")
+
+    assert not any(deduplicator.seen(template.format(interval)) for interval in range(10, 500, 7))
+
+def test_pdf_pages_keep_their_sections_and_drop_the_repeated_notice():
+    pages = [(page_number, f"{page_number}.1 Pump\nThe pump must be greased every {page_number * 10} hours.\n{SAFETY_NOTICE}")
+             for page_number in range(1, 6)]
+
+    chunks = list(iter_chunks("pdf_sections", pages))
+
+    assert sum(SAFETY_NOTICE in chunk for _, chunk in chunks) == 1
+    assert [page_number for page_number, chunk in chunks if "greased" in chunk] == [1, 2, 3, 4, 5]
+
+def test_csv_row_groups_repeat_the_header():
+    rows = "\n".join(f"ORD-{i:05d},customer {i},{i * 3}.50" for i in range(400))
+
+    chunks = CsvRowChunker(64).split(f"order_id,customer,amount\n{rows}")
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith("order_id,customer,amount\n") for chunk in chunks)
@@ -0,0 +1,48 @@
+import threading, time
+from services.index_registry import IndexRegistry
+
+def test_concurrent_checkouts_open_a_new_collection_once():
+    opened = []
+
+    def open_index(chroma_collection_name: str):
+        opened.append(chroma_collection_name)
+        time.sleep(0.05)
+        return object()
+
+    registry = IndexRegistry(open_index, max_loaded=4)
+    barrier = threading.Barrier(20)
+    indexes = []
+
+    def query():
+        barrier.wait()
+        with registry.use(1, lambda: "collection_1") as index:
+            indexes.append(index)
+
+    threads = [threading.Thread(target=query) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert opened == ["collection_1"]
+    assert len(indexes) == 20 and all(index is indexes[0] for index in indexes)
+    assert registry.stats()["in_use"] == 0
+
+def test_removal_waits_for_in_flight_checkouts():
+    registry = IndexRegistry(lambda chroma_collection_name: object(), max_loaded=4)
+    registry.checkout(1, lambda: "collection_1")
+    threading.Timer(0.1, registry.release, args=(1,)).start()
+
+    assert registry.begin_removal(1, timeout=5)
+    assert registry.checkout(1, lambda: "collection_1") is None
+    registry.end_removal(1)
+    assert registry.checkout(1, lambda: "collection_1") is not None
+
+def test_removal_times_out_while_index_is_checked_out():
+    registry = IndexRegistry(lambda chroma_collection_name: object(), max_loaded=4)
+    index = registry.checkout(1, lambda: "collection_1")
+
+    assert not registry.begin_removal(1, timeout=0.05)
+    # the collection stays usable, nothing was dropped under the in-flight user
+    assert registry.checkout(1) is index
+    assert registry.stats()["loaded"] == 1
@@ -0,0 +1,68 @@
+import os, socket, subprocess, sys, tempfile
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.models import Base, Collection, Document, IngestionJobRecord
+from services import ingestion
+from services.ingestion import IngestionQueue, IngestionJob
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.sqlite3'}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    db.add(Collection(id=1, name="manuals"))
+    db.commit()
+    db.close()
+    return session_factory
+
+def run_next(ingestion_queue: IngestionQueue):
+    ingestion_queue._run(ingestion_queue.queue.get_nowait())
+
+def test_any_worker_reads_the_job_status(session_factory, monkeypatch):
+    monkeypatch.setattr(ingestion, "index_document", lambda document, content, db: 3)
+    uploading_worker = IngestionQueue(1, 10, 3600)
+    uploading_worker.session_factory = session_factory
+
+    job = uploading_worker.submit(IngestionJob(1, 1, "notes.txt", "txt", b"The pump is oiled every ten days."))
+    assert session_factory().get(IngestionJobRecord, job.id).status == "queued"
+    run_next(uploading_worker)
+
+    # a poll served by another process only has the database
+    record = session_factory().get(IngestionJobRecord, job.id)
+    assert (record.status, record.chunk_count, record.error) == ("completed", 3, None)
+    assert ingestion.job_status(record)["document_id"] == job.document_id
+
+def test_failed_new_upload_leaves_no_document(session_factory, monkeypatch):
+    def fail(document, content, db):
+        raise RuntimeError("embedding failed")
+    monkeypatch.setattr(ingestion, "index_document", fail)
+    ingestion_queue = IngestionQueue(1, 10, 3600)
+    ingestion_queue.session_factory = session_factory
+
+    job = ingestion_queue.submit(IngestionJob(1, 1, "notes.txt", "txt", b"The pump is oiled every ten days."))
+    run_next(ingestion_queue)
+
+    db = session_factory()
+    record = db.get(IngestionJobRecord, job.id)
+    assert (record.status, record.error, record.document_id) == ("failed", "embedding failed", None)
+    assert db.query(Document).count() == 0
+
+def test_jobs_of_a_stopped_worker_are_failed_and_their_uploads_removed(session_factory):
+    stopped = subprocess.Popen([sys.executable, "-c", "pass"])
+    stopped.wait()
+    with tempfile.NamedTemporaryFile(delete=False, prefix="upload_") as spooled:
+        spooled.write(b"%PDF")
+    db = session_factory()
+    db.add_all([IngestionJobRecord(id="interrupted", user_id=1, collection_id=1, status="processing",
+                                   worker=f"{socket.gethostname()}:{stopped.pid}", spool_path=spooled.name),
+                IngestionJobRecord(id="elsewhere", user_id=1, collection_id=1, status="queued", worker="other-host:1")])
+    db.commit()
+
+    IngestionQueue(1, 10, 3600).start(session_factory)
+
+    db = session_factory()
+    assert db.get(IngestionJobRecord, "interrupted").status == "failed"
+    assert db.get(IngestionJobRecord, "elsewhere").status == "queued"
+    assert not os.path.exists(spooled.name)
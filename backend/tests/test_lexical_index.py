@@ -0,0 +1,46 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+from services.lexical_index import LexicalIndexes, HybridRetriever, reciprocal_rank_fusion
+
+def hit(node_id: str, score: float):
+    return NodeWithScore(node=TextNode(id_=node_id, text=node_id), score=score)
+
+def test_fusion_orders_by_rank_and_keeps_the_vector_similarity():
+    vector_results = [hit("a", 0.91), hit("b", 0.85), hit("c", 0.80)]
+    lexical_results = [hit("c", 12.0), hit("d", 9.0), hit("a", 4.0)]
+
+    fused = reciprocal_rank_fusion([vector_results, lexical_results], top_k=4)
+
+    assert [result.node.node_id for result in fused] == ["a", "c", "b", "d"]
+    assert [result.score for result in fused] == [0.91, 0.80, 0.85, None]
+
+def test_search_finds_part_numbers(tmp_path):
+    lexical_indexes = LexicalIndexes(str(tmp_path))
+    lexical_indexes.add(1, [TextNode(id_=f"node-{i}", text=f"Part PN-{i:04d} is inspected every {i} hours.",
+                                     metadata={"document_id": 1, "chunk_index": i}) for i in range(50)])
+
+    results = lexical_indexes.search(1, "When is PN-0042 inspected?", 3)
+
+    assert results[0].node.node_id == "node-42"
+    assert results[0].node.metadata["collection_id"] == 1
+
+def test_hybrid_retrieval_searches_the_plain_question(tmp_path):
+    from llama_index.core import VectorStoreIndex
+    from services.rag_functionality import retrieval_bundle
+    from benchmarks.serve import HashEmbedding
+
+    nodes = [TextNode(id_=f"node-{i}", text=f"Part PN-{i:04d} is inspected every {i} hours.",
+                      metadata={"document_id": 1, "chunk_index": i}) for i in range(50)]
+    lexical_indexes = LexicalIndexes(str(tmp_path))
+    lexical_indexes.add(1, nodes)
+    searched = []
+    search = lexical_indexes.search
+    lexical_indexes.search = lambda collection_id, query, top_k: searched.append(query) or search(collection_id, query, top_k)
+    index = VectorStoreIndex(nodes, embed_model=HashEmbedding())
+    retriever = HybridRetriever(index.as_retriever(similarity_top_k=10), lexical_indexes, 1, 10, 2)
+    history = " ".join(f"Part PN-{i:04d} was replaced last week." for i in range(20))
+
+    results = retriever.retrieve(retrieval_bundle("When is PN-0042 inspected?",
+                                                  f"Previous conversation context:\n{history}\nCurrent question: When is PN-0042 inspected?"))
+
+    assert searched == ["When is PN-0042 inspected?"]
+    assert results[0].node.node_id == "node-42"
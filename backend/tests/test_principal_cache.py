@@ -0,0 +1,41 @@
+import asyncio
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db.models import Base, User
+from services.principal_cache import PrincipalCache
+
+def test_async_hits_skip_the_session_and_profile_updates_invalidate(tmp_path):
+    database_path = tmp_path / "users.sqlite3"
+    engine = create_engine(f"sqlite:///{database_path}")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, name="ana", password_hash="hash", email="ana@example.com"))
+    db.commit()
+    principal_cache = PrincipalCache(max_entries=10, ttl=60)
+
+    async def lookup(async_db=None):
+        return await principal_cache.aget_user(1, async_db)
+
+    async def run():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{database_path}")
+        try:
+            async with async_sessionmaker(async_engine)() as async_db:
+                first = await lookup(async_db)
+            # a hit never touches the session, so None stands in for it
+            second = await lookup()
+            return first, second
+        finally:
+            await async_engine.dispose()
+
+    first, second = asyncio.run(run())
+    assert (first.email, second.email) == ("ana@example.com", "ana@example.com")
+    assert principal_cache.stats()["hits"] == 1
+
+    # update_profile path: the sync session edits the cached user and commits, then the entry is dropped
+    user = principal_cache.get_user(1, db)
+    user.email = "ana@example.org"
+    db.commit()
+    principal_cache.invalidate(1)
+
+    assert principal_cache.get_user(1, sessionmaker(bind=engine)()).email == "ana@example.org"
@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.models import Base, Collection, Document
+from services import rag_functionality
+from benchmarks.serve import HashEmbedding
+
+# the hashed bag-of-words stand-in from the benchmarks keeps the HuggingFace model out of the tests
+rag_functionality.embed_model._load_model = HashEmbedding
+
+PARAGRAPHS = [f"Section {i}. The conveyor belt number {i} must be checked for wear every {i * 10} operating hours "
+              f"and replaced when cracks longer than {i} millimetres are found." for i in range(1, 13)]
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Collection(id=1, name="manuals"))
+    session.commit()
+    yield session
+    session.close()
+
+def stored_chunks(document_id: int, db):
+    with rag_functionality.use_collection_index(1, db) as index:
+        return rag_functionality.document_chunks(index, document_id)
+
+def test_reindex_keeps_vectors_of_unchanged_chunks(db, monkeypatch):
+    # one paragraph per chunk, so a changed paragraph changes exactly one chunk
+    monkeypatch.setattr(rag_functionality, "chunk_document",
+                        lambda document, content, db: [(None, paragraph) for paragraph in content.split("\n\n")])
+    document = Document(id=1, file_name="manual.txt", file_type="txt", collection_id=1)
+    db.add(document)
+    db.commit()
+
+    assert rag_functionality.index_document(document, "\n\n".join(PARAGRAPHS), db) == len(PARAGRAPHS)
+    before = stored_chunks(document.id, db)
+
+    embedded = []
+    build_nodes = rag_functionality.build_nodes
+    monkeypatch.setattr(rag_functionality, "build_nodes",
+                        lambda text_chunks, metadatas: embedded.extend(text_chunks) or build_nodes(text_chunks, metadatas))
+    changed = PARAGRAPHS[:3] + [PARAGRAPHS[3].replace("every 40", "every 45")] + PARAGRAPHS[5:]
+
+    assert rag_functionality.reindex_document(document, "\n\n".join(changed), db) == (len(changed), 1)
+    assert embedded == [changed[3]]
+
+    after = stored_chunks(document.id, db)
+    assert len(after) == len(changed)
+    assert len(set(before) & set(after)) == len(changed) - 1
+    # chunks after the removed paragraph moved up one position, their metadata follows them
+    assert sorted(metadata["chunk_index"] for metadata in after.values()) == list(range(len(changed)))
+    assert {metadata["chunk_hash"] for metadata in after.values()} == \
+        {rag_functionality.embedding_cache.hash_text(paragraph) for paragraph in changed}
+
+def test_reindex_moves_lexical_hits_to_their_new_page(db, monkeypatch):
+    # a PDF document whose pages are separated by blank lines here, one paragraph per page
+    monkeypatch.setattr(rag_functionality, "chunk_document",
+                        lambda document, content, db: list(enumerate(content.split("\n\n"), start=1)))
+    document = Document(id=2, file_name="manual.pdf", file_type="pdf", collection_id=1)
+    db.add(document)
+    db.commit()
+
+    rag_functionality.index_document(document, "\n\n".join(PARAGRAPHS[:4]), db)
+    # a new first page pushes every existing paragraph one page down
+    rag_functionality.reindex_document(document, "\n\n".join(["Cover page of the conveyor manual."] + PARAGRAPHS[:4]), db)
+
+    hits = rag_functionality.lexical_indexes.search(1, "millimetres cracks 3", 20)
+    pages = {hit.node.get_content(): hit.node.metadata.get("page_number") for hit in hits if hit.node.metadata["document_id"] == 2}
+    assert pages == {paragraph: page_number for page_number, paragraph in enumerate(PARAGRAPHS[:4], start=2)}
+    assert {metadata["page_number"] for metadata in stored_chunks(document.id, db).values()} == {1, 2, 3, 4, 5}
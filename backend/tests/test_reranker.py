@@ -0,0 +1,43 @@
+from llama_index.core import VectorStoreIndex
+from llama_index.core.llms import MockLLM
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from services.reranker import CrossEncoderRerank
+from services.rag_functionality import retrieval_bundle
+from benchmarks.serve import HashEmbedding
+
+class RecordingCrossEncoder:
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        self.pairs.extend(pairs)
+        # longer chunks score higher, so the order is easy to predict
+        return [len(text) for _, text in pairs]
+
+def rerank(top_n: int, token_budget: int):
+    reranker = CrossEncoderRerank(model="recording", top_n=top_n, token_budget=token_budget, batch_size=16)
+    reranker._model = RecordingCrossEncoder()
+    return reranker
+
+def test_query_engine_reranks_against_the_plain_question():
+    nodes = [TextNode(text=f"The press {i} must be oiled every {i} days.") for i in range(10)]
+    reranker = rerank(top_n=2, token_budget=1500)
+    query_engine = RetrieverQueryEngine.from_args(VectorStoreIndex(nodes, embed_model=HashEmbedding()).as_retriever(similarity_top_k=5),
+                                                  llm=MockLLM(), node_postprocessors=[reranker])
+    history = "Previous conversation context:\n" + "\n".join(f"user: what about the lathe {i}?" for i in range(200))
+
+    results = query_engine.retrieve(retrieval_bundle("How often is press 3 oiled?", f"{history}\nCurrent question: How often is press 3 oiled?"))
+
+    assert len(results) == 2
+    assert {query for query, _ in reranker._model.pairs} == {"How often is press 3 oiled?"}
+
+def test_chunks_over_the_token_budget_are_skipped():
+    reranker = rerank(top_n=2, token_budget=15)
+    nodes = [NodeWithScore(node=TextNode(text=text), score=0.5) for text in
+             ["one two three four five six seven eight nine ten", "one two three four five six seven eight nine ten eleven",
+              "alpha beta"]]
+
+    kept = reranker.postprocess_nodes(nodes, QueryBundle("question"))
+
+    assert [node.node.get_content() for node in kept] == ["one two three four five six seven eight nine ten eleven", "alpha beta"]
@@ -0,0 +1,25 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.models import Base
+from services.response_cache import ResponseCache
+from services.rag_functionality import bump_collection_version, collection_version_query
+
+def test_a_version_bump_expires_answers_cached_by_other_workers():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    worker_cache = ResponseCache(max_entries=10, ttl=3600, similarity_threshold=0.95)
+
+    def version():
+        return db.scalar(collection_version_query(1)) or 0
+
+    worker_cache.store(1, version(), "gpt-4o-mini", None, [1.0, 0.0], {"response": "before the upload", "sources": []})
+    assert worker_cache.lookup(1, version(), "gpt-4o-mini", None, [0.99, 0.01])["response"] == "before the upload"
+
+    # another worker indexes a document into the collection
+    bump_collection_version(1, db)
+    bump_collection_version(1, db)
+
+    assert version() == 2
+    assert worker_cache.lookup(1, version(), "gpt-4o-mini", None, [0.99, 0.01]) is None
+    assert worker_cache.stats()["entries"] == 0
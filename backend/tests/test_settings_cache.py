@@ -0,0 +1,29 @@
+import asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db.models import Base, AdminSettings
+from services.rag_functionality import SettingsCache
+
+def test_concurrent_async_lookups_do_not_block_the_event_loop(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'settings.sqlite3'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as db:
+            db.add_all([AdminSettings(setting_key="openai_model", setting_value="gpt-4o-mini"),
+                        AdminSettings(setting_key="settings_version", setting_value="1")])
+            await db.commit()
+
+        # an interval of 0 makes every lookup refresh, which is where a lock held across a query used to hang
+        settings_cache = SettingsCache(0)
+
+        async def lookup():
+            async with session_factory() as db:
+                return await settings_cache.aget("openai_model", db)
+
+        try:
+            return await asyncio.wait_for(asyncio.gather(*(lookup() for _ in range(8))), timeout=10)
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(run()) == ["gpt-4o-mini"] * 8
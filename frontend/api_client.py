@@ -1,5 +1,6 @@
 import requests
-from typing import Optional, Dict
+import json
+from typing import Optional, Dict, Iterator, List, Tuple
 
 
 class APIClient:
@@ -26,10 +27,11 @@ class APIClient:
         headers = self._get_headers(token)
         return requests.get(url, headers=headers)
     
-    def get_collections(self, token: str) -> requests.Response:
+    def get_collections(self, token: str, cursor: Optional[int] = None) -> requests.Response:
         url = f"{self.base_url}/collections/"
+        params = {"cursor": cursor} if cursor is not None else {}
         headers = self._get_headers(token)
-        return requests.get(url, headers=headers)
+        return requests.get(url, params=params, headers=headers)
     
     def create_collection(self, name: str, token: str) -> requests.Response:
         url = f"{self.base_url}/collections"
@@ -37,6 +39,11 @@ class APIClient:
         headers = self._get_headers(token)
         return requests.post(url, json=payload, headers=headers)
     
+    def update_chunking(self, collection_id: int, strategies: Dict[str, str], token: str) -> requests.Response:
+        url = f"{self.base_url}/collections/{collection_id}/chunking"
+        headers = self._get_headers(token)
+        return requests.put(url, json={"strategies": strategies}, headers=headers)
+    
     def upload_document(self, file_name: str, file_content: bytes, 
                        collection_id: int, token: str) -> requests.Response:
         url = f"{self.base_url}/documents/upload"
@@ -45,6 +52,22 @@ class APIClient:
         headers = self._get_headers(token)
         return requests.post(url, files=files, params=params, headers=headers)
     
+    def replace_document(self, document_id: int, file_name: str, file_content: bytes, token: str) -> requests.Response:
+        url = f"{self.base_url}/documents/{document_id}"
+        files = {"file": (file_name, file_content)}
+        headers = self._get_headers(token)
+        return requests.put(url, files=files, headers=headers)
+    
+    def delete_document(self, document_id: int, token: str) -> requests.Response:
+        url = f"{self.base_url}/documents/{document_id}"
+        headers = self._get_headers(token)
+        return requests.delete(url, headers=headers)
+    
+    def get_ingestion_job(self, job_id: str, token: str) -> requests.Response:
+        url = f"{self.base_url}/documents/jobs/{job_id}"
+        headers = self._get_headers(token)
+        return requests.get(url, headers=headers)
+    
     def get_chat_history(self, collection_id: int, token: str) -> requests.Response:
         url = f"{self.base_url}/chat-history/{collection_id}"
         headers = self._get_headers(token)
@@ -61,3 +84,37 @@ class APIClient:
         payload = {"collection_id": collection_id, "query": query}
         headers = self._get_headers(token)
         return requests.post(url, json=payload, headers=headers)
+    
+    def query_collections(self, collection_ids: List[int], query: str, token: str) -> requests.Response:
+        url = f"{self.base_url}/query/multi"
+        payload = {"collection_ids": collection_ids, "query": query}
+        headers = self._get_headers(token)
+        return requests.post(url, json=payload, headers=headers)
+    
+    def query_batch(self, collection_id: int, queries: List[str], token: str) -> requests.Response:
+        url = f"{self.base_url}/query/batch"
+        payload = {"collection_id": collection_id, "queries": queries}
+        headers = self._get_headers(token)
+        return requests.post(url, json=payload, headers=headers, stream=True)
+    
+    def query_simple_stream(self, collection_id: int, query: str, token: str) -> requests.Response:
+        url = f"{self.base_url}/query/simple/stream"
+        payload = {"collection_id": collection_id, "query": query}
+        headers = self._get_headers(token)
+        return requests.post(url, json=payload, headers=headers, stream=True)
+    
+    def query_chat_stream(self, collection_id: int, query: str, token: str) -> requests.Response:
+        url = f"{self.base_url}/query/chat/stream"
+        payload = {"collection_id": collection_id, "query": query}
+        headers = self._get_headers(token)
+        return requests.post(url, json=payload, headers=headers, stream=True)
+    
+    @staticmethod
+    def iter_events(response: requests.Response) -> Iterator[Tuple[str, Dict]]:
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                yield event, json.loads(line[len("data: "):])
+                event = "message"
@@ -1,5 +1,4 @@
 import streamlit as st
-import time
 from typing import List, Dict, Optional
 from api_client import APIClient
 
@@ -147,7 +146,12 @@ class RAGilityApp:
         st.header("Collections")
         response = self.api_client.get_collections(st.session_state["token"])
         if response.status_code == 200:
-            collections = response.json()
+            page = response.json()
+            collections, next_cursor = page["items"], page["next_cursor"]
+            while next_cursor is not None:
+                page = self.api_client.get_collections(st.session_state["token"], cursor=next_cursor).json()
+                collections.extend(page["items"])
+                next_cursor = page["next_cursor"]
             if collections:
                 for col in collections:
                     st.markdown(f"**ID:** {col['id']} | **Name:** {col['name']} | **Created:** {col['created_at']}")
@@ -181,13 +185,24 @@ class RAGilityApp:
                 int(collection_id), 
                 st.session_state["token"]
             )
-            if response.status_code == 200:
-                st.success("Document uploaded successfully!")
+            if response.status_code == 202:
+                job_id = response.json()["job_id"]
+                st.success(f"Document queued for processing (job {job_id})")
+                self._render_ingestion_status(job_id)
             else:
                 st.error("Failed to upload document")
         
         st.markdown("---")
     
+    def _render_ingestion_status(self, job_id: str):
+        response = self.api_client.get_ingestion_job(job_id, st.session_state["token"])
+        if response.status_code == 200:
+            job = response.json()
+            if job["status"] == "failed":
+                st.error(f"Processing failed: {job['error']}")
+            else:
+                st.caption(f"Status: {job['status']}")
+    
     def render_header(self, logo_path: str = "images/icon.png") -> tuple:
         col1, col2, col3, col4 = st.columns([3, 5, 5, 4])
         
@@ -214,10 +229,12 @@ class RAGilityApp:
         
         return query_type, chat_collection_id
     
-    def response_generator(self, response_text: str):
-        for word in response_text.split():
-            yield word + " "
-            time.sleep(0.05)
+    def response_generator(self, response):
+        for event, data in self.api_client.iter_events(response):
+            if event == "token":
+                yield data["token"]
+            elif event == "error":
+                st.error(f"Failed to get response from AI: {data['detail']}")
     
     def render_chat_interface(self, query_type: Optional[str], chat_collection_id: Optional[str]):
         if not st.session_state["authenticated"]:
@@ -252,23 +269,22 @@ class RAGilityApp:
                     st.markdown(prompt)
                 
                 if query_type == "Simple":
-                    response = self.api_client.query_simple(
+                    response = self.api_client.query_simple_stream(
                         current_collection_id, 
                         prompt, 
                         st.session_state["token"]
                     )
                 else:
-                    response = self.api_client.query_chat(
+                    response = self.api_client.query_chat_stream(
                         current_collection_id, 
                         prompt, 
                         st.session_state["token"]
                     )
                 
                 if response.status_code == 200:
-                    result = response.json()
                     with st.chat_message("assistant"):
-                        response_text = st.write_stream(self.response_generator(result["response"]))
-                    st.session_state.messages.append({"role": "assistant", "content": result["response"]})
+                        response_text = st.write_stream(self.response_generator(response))
+                    st.session_state.messages.append({"role": "assistant", "content": response_text})
                 else:
                     st.error("Failed to get response from AI")
     